@@ -1,13 +1,22 @@
+from django.core.cache import cache
+from django.test import override_settings
 from django.utils.http import urlencode
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from favourite_manager import valid_url_cache
 from favourite_manager.models import FavouriteCategory, FavouriteTag, FavouriteUrl
 from user_manager.models import User
 
 
+# Tests never touch the Redis instance a development server may be using
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
 class BaseTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+        valid_url_cache.local_cache.clear()
         self.current_user = None
         self.url = None
         self.query_params = None
@@ -90,6 +99,9 @@ class BaseTestCase(APITestCase):
     def assertResponseCreated(self):
         self.assertEqual(self.response.status_code, status.HTTP_201_CREATED)
 
+    def assertResponseAccepted(self):
+        self.assertEqual(self.response.status_code, status.HTTP_202_ACCEPTED)
+
     def assertResponseNoContent(self):
         self.assertEqual(self.response.status_code, status.HTTP_204_NO_CONTENT)
 
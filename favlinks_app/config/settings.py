@@ -10,22 +10,42 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name, default=""):
+    return [
+        item.strip()
+        for item in os.environ.get(name, default).split(",")
+        if item.strip()
+    ]
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-#ey((qg@t8i)5+)7afhcgu!=!c@mscrpm@xrzs6m+^niil80p5"
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-#ey((qg@t8i)5+)7afhcgu!=!c@mscrpm@xrzs6m+^niil80p5",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_bool("DJANGO_DEBUG")
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1")
+CSRF_TRUSTED_ORIGINS = env_list("DJANGO_CSRF_TRUSTED_ORIGINS")
 
 
 # Application definition
@@ -37,6 +57,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "drf_yasg",
@@ -48,6 +69,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -83,11 +105,19 @@ WSGI_APPLICATION = "config.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "postgres",
-        "USER": "postgres",
-        "PASSWORD": "password",
-        "HOST": "db",
-        "PORT": "5432",
+        "NAME": os.environ.get("POSTGRES_DB", "postgres"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "password"),
+        "HOST": os.environ.get("POSTGRES_HOST", "db"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # Seconds a connection is kept for the next request or Celery task,
+        # pinged before it is reused; 0 closes it after each one
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": env_bool("DATABASE_CONN_HEALTH_CHECKS", True),
+        # Set when connecting through a transaction-mode pooler such as PgBouncer,
+        # where a cursor cannot outlive its transaction. psycopg2 does not use
+        # server-side prepared statements
+        "DISABLE_SERVER_SIDE_CURSORS": env_bool("DATABASE_POOLER"),
     }
 }
 
@@ -127,6 +157,13 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 STATIC_ROOT = "static"
+# Served by WhiteNoise from the worker processes: hashed names cached forever,
+# gzip/brotli variants built once by collectstatic
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# Uploaded files. Queued bookmark imports wait here for a worker, so the web
+# and worker containers must share it (both mount the app directory)
+MEDIA_ROOT = BASE_DIR / "media"
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -135,9 +172,90 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Super Admin Credentials
 AUTH_USER_MODEL = "user_manager.User"
-SUPER_ADMIN_USERNAME = "admin"
-SUPER_ADMIN_PASS = "Test1234++"
+SUPER_ADMIN_USERNAME = os.environ.get("SUPER_ADMIN_USERNAME", "admin")
+SUPER_ADMIN_PASS = os.environ.get("SUPER_ADMIN_PASS", "Test1234++")
 
 # Celery Config
-CELERY_BROKER_URL = "redis://redis:6379/0"
-CELERY_RESULT_BACKEND = "redis://redis:6379/0"
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://redis:6379/0")
+CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+
+# Cache Config
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+# Seconds a cached list/retrieve response lives if no write invalidates it
+RESPONSE_CACHE_TIMEOUT = 300
+# ValidUrl lookups by URL: shared cache entries are written through on every
+# change, the per-process LRU tier in front of it can lag by its timeout
+VALID_URL_CACHE_TIMEOUT = 24 * 60 * 60
+VALID_URL_CACHE_LOCAL_SIZE = 10000
+VALID_URL_CACHE_LOCAL_TIMEOUT = 60
+# Seconds between checks of the shared generation a ValidUrl delete bumps, so
+# other processes drop deleted rows from their local tier within this interval
+VALID_URL_CACHE_GENERATION_INTERVAL = 5
+
+# Full-text search configuration used for the favourite URL search vector
+FAVOURITE_SEARCH_CONFIG = "english"
+# Default word similarity (0-1) for the fuzzy "similar" filter. None uses the
+# database's pg_trgm.word_similarity_threshold (0.6 unless set with ALTER
+# DATABASE ... SET), the only threshold the trigram indexes can serve
+FAVOURITE_SIMILARITY_THRESHOLD = None
+# Largest list accepted by the favourite URL bulk endpoint
+FAVOURITE_BULK_MAX_ITEMS = 1000
+# Bookmarks written per transaction by the importer
+BOOKMARK_IMPORT_BATCH_SIZE = 500
+# Largest export the import endpoint accepts; bigger files go through the
+# import_bookmarks management command
+BOOKMARK_IMPORT_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Largest export imported inside the request; bigger uploads are queued to a
+# Celery task so the request stays well within the worker timeout
+BOOKMARK_IMPORT_SYNC_MAX_SIZE = 256 * 1024
+# Seconds after which placeholder folders left by an interrupted import are
+# removed (their favourites are kept without a category)
+BOOKMARK_IMPORT_PLACEHOLDER_RETENTION = 60 * 60 * 24
+# Rows fetched (and tags prefetched) per server-side cursor chunk on export
+EXPORT_CHUNK_SIZE = 2000
+# Most favourite URLs a user can keep, checked against the per-user counters;
+# None for no limit
+FAVOURITE_URLS_PER_USER_LIMIT = 100000
+
+# Favourite URL validation
+# When enabled, new URLs are accepted as pending and validated by a Celery task
+ASYNC_URL_VALIDATION = False
+# Most bytes of a page read while looking for its <title>
+URL_TITLE_MAX_BYTES = 64 * 1024
+# Concurrent fetches used by the periodic revalidation task, overall and per host
+URL_VALIDATION_CONCURRENCY = 32
+URL_VALIDATION_PER_HOST_CONCURRENCY = 4
+# Rows written back per bulk update during revalidation
+URL_VALIDATION_BATCH_SIZE = 500
+# Rows per Celery task when the periodic revalidation fans out across workers
+URL_VALIDATION_CHUNK_SIZE = 5000
+# Most URLs picked up by one periodic revalidation run
+URL_VALIDATION_MAX_PER_RUN = 100000
+# Bounds in seconds for the adaptive revalidation interval of a single URL
+URL_VALIDATION_MIN_INTERVAL = 60 * 60
+URL_VALIDATION_MAX_INTERVAL = 60 * 60 * 24 * 7
+# The validate endpoint answers from results checked within this many seconds
+URL_VALIDATION_FRESHNESS = 60 * 60
+# Longest a fetch of one URL, queued or running, holds off other fetches of it
+URL_VALIDATION_LOCK_TIMEOUT = 30
+# Longest a sync validate request waits for a fetch running elsewhere before
+# answering 202; well below the gunicorn worker timeout
+URL_VALIDATION_SYNC_WAIT = 5
+# Seconds an invalid or pending URL no favourite points to is kept before the
+# daily clean-up deletes it
+INVALID_URL_RETENTION = 60 * 60 * 24 * 7
+
+# Outbound HTTP client shared by the API and the Celery tasks
+HTTP_CLIENT_CONNECT_TIMEOUT = 5
+HTTP_CLIENT_READ_TIMEOUT = 10
+HTTP_CLIENT_RETRIES = 2
+HTTP_CLIENT_BACKOFF_FACTOR = 0.5
+HTTP_CLIENT_MAX_REDIRECTS = 5
+# Number of hosts with kept-alive connections, and connections kept per host
+HTTP_CLIENT_POOL_CONNECTIONS = 100
+HTTP_CLIENT_POOL_MAXSIZE = URL_VALIDATION_PER_HOST_CONCURRENCY
@@ -3,9 +3,20 @@ from .models import FavouriteCategory, FavouriteTag, FavouriteUrl, ValidUrl
 
 
 class ValidUrlAdminView(admin.ModelAdmin):
-    list_display = ["url", "title", "is_valid", "updated_at"]
+    list_display = ["url", "title", "is_valid", "next_check_at", "updated_at"]
     search_fields = ["url", "title"]
-    readonly_fields = ["url", "title", "updated_at", "is_valid"]
+    readonly_fields = [
+        "url",
+        "title",
+        "updated_at",
+        "is_valid",
+        "checked_at",
+        "next_check_at",
+        "consecutive_failures",
+        "last_changed_at",
+        "etag",
+        "last_modified",
+    ]
     list_filter = ["is_valid", "updated_at"]
 
 
@@ -14,6 +25,10 @@ class FavouriteCategoryAdminView(admin.ModelAdmin):
     search_fields = ["name", "user"]
     list_filter = ["created_at", "updated_at"]
     readonly_fields = ["created_at", "updated_at", "associated_urls_count"]
+    list_select_related = ["user"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_urls_count()
 
 
 class FavouriteTagAdminView(admin.ModelAdmin):
@@ -21,6 +36,10 @@ class FavouriteTagAdminView(admin.ModelAdmin):
     search_fields = ["name", "user"]
     list_filter = ["created_at", "updated_at"]
     readonly_fields = ["created_at", "updated_at", "associated_urls_count"]
+    list_select_related = ["user"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_urls_count()
 
 
 class FavouriteUrlAdminView(admin.ModelAdmin):
@@ -36,7 +55,8 @@ class FavouriteUrlAdminView(admin.ModelAdmin):
     search_fields = ["title", "url", "user", "category", "tag"]
     list_filter = ["created_at", "updated_at"]
     filter_horizontal = ["tags"]
-    readonly_fields = ["is_valid", "created_at", "updated_at"]
+    readonly_fields = ["is_valid", "valid_url", "created_at", "updated_at"]
+    list_select_related = ["user", "category", "valid_url"]
 
 
 admin.site.register(ValidUrl, ValidUrlAdminView)
@@ -0,0 +1,203 @@
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from favourite_manager import valid_url_cache
+from favourite_manager.cache import batched_invalidation, invalidate_user_cache
+from favourite_manager.celery import validate_urls_and_update_favourite_titles
+from favourite_manager.counters import (
+    adjust_counts,
+    deferred_counts,
+    get_favourite_url_quota_left,
+)
+from favourite_manager.models import (
+    FavouriteCategory,
+    FavouriteTag,
+    FavouriteUrl,
+    ValidationStatus,
+    ValidUrl,
+    get_owned_ids,
+)
+from favourite_manager.search import update_search_vectors
+
+
+def resolve_valid_urls(urls):
+    valid_urls = valid_url_cache.get_valid_urls(urls)
+    missing_urls = [url for url in urls if url not in valid_urls]
+    if not missing_urls:
+        return valid_urls
+
+    # ignore_conflicts leaves primary keys unset, so the new rows are read back
+    ValidUrl.objects.bulk_create(
+        [ValidUrl(url=url) for url in missing_urls], ignore_conflicts=True
+    )
+    created = list(ValidUrl.objects.filter(url__in=missing_urls))
+    valid_urls.update((obj.url, obj) for obj in created)
+    transaction.on_commit(lambda: valid_url_cache.store_valid_urls(created))
+
+    # bulk_create skips the post_save signal that links existing favourites
+    FavouriteUrl.objects.filter(url__in=missing_urls, valid_url__isnull=True).update(
+        valid_url=Subquery(
+            ValidUrl.objects.filter(url=OuterRef("url")).values("id")[:1]
+        )
+    )
+    created_ids = [obj.id for obj in created]
+    transaction.on_commit(
+        lambda: validate_urls_and_update_favourite_titles.delay(created_ids)
+    )
+    return valid_urls
+
+
+def create_favourite_urls(favourite_urls):
+    """Inserts the rows, one at a time if a concurrent write collides with one.
+
+    Rows that could not be inserted are left without a primary key.
+    """
+    try:
+        with transaction.atomic():
+            FavouriteUrl.objects.bulk_create(favourite_urls)
+    except IntegrityError:
+        for favourite_url in favourite_urls:
+            try:
+                with transaction.atomic():
+                    FavouriteUrl.objects.bulk_create([favourite_url])
+            except IntegrityError:
+                pass
+    return [favourite_url for favourite_url in favourite_urls if favourite_url.pk]
+
+
+@transaction.atomic
+def bulk_save_favourite_urls(user, items):
+    results = [None] * len(items)
+    first_index = {}
+    for index, item in enumerate(items):
+        if item["url"] in first_index:
+            results[index] = {
+                "url": item["url"],
+                "status": "error",
+                "errors": {"url": ["Duplicate of an earlier item"]},
+            }
+        else:
+            first_index[item["url"]] = index
+
+    urls = list(first_index)
+    existing = {
+        obj.url: obj for obj in FavouriteUrl.objects.filter(user=user, url__in=urls)
+    }
+    category_ids = get_owned_ids(
+        FavouriteCategory,
+        user.id,
+        [item["category"] for item in items if item.get("category") is not None],
+    )
+    tag_ids = get_owned_ids(
+        FavouriteTag, user.id, [tag for item in items for tag in item.get("tags", [])]
+    )
+    valid_urls = resolve_valid_urls(urls)
+    # Checked against the counter, not locked; concurrent writes may overshoot
+    quota_left = get_favourite_url_quota_left(user)
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    saved = []
+    tags_to_set = []
+    for url, index in first_index.items():
+        item = items[index]
+        valid_url = valid_urls[url]
+        if valid_url.validation_status == ValidationStatus.INVALID:
+            results[index] = {
+                "url": url,
+                "status": "error",
+                "errors": {"url": ["URL is not valid"]},
+            }
+            continue
+
+        favourite_url = existing.get(url)
+        if favourite_url is None and quota_left == 0:
+            results[index] = {
+                "url": url,
+                "status": "error",
+                "errors": {"url": ["Favourite URL limit reached"]},
+            }
+            continue
+        if favourite_url is None:
+            if quota_left is not None:
+                quota_left -= 1
+            favourite_url = FavouriteUrl(
+                user=user,
+                url=url,
+                title=item.get("title", valid_url.title),
+                valid_url_id=valid_url.id,
+            )
+            to_create.append(favourite_url)
+            results[index] = {"url": url, "status": "created"}
+        else:
+            favourite_url.title = item.get("title", favourite_url.title)
+            favourite_url.valid_url_id = valid_url.id
+            favourite_url.updated_at = now
+            to_update.append(favourite_url)
+            results[index] = {"url": url, "status": "updated"}
+
+        # Categories and tags of other users are ignored, as in create/update
+        category = item.get("category")
+        if category in category_ids or ("category" in item and category is None):
+            favourite_url.category_id = category
+        if "tags" in item:
+            tags_to_set.append(
+                (favourite_url, [tag for tag in item["tags"] if tag in tag_ids])
+            )
+        saved.append((index, favourite_url))
+
+    created = create_favourite_urls(to_create)
+    adjust_counts(FavouriteUrl, user.id, len(created))
+    if len(created) < len(to_create):
+        for index, favourite_url in saved:
+            if favourite_url.pk is None:
+                results[index] = {
+                    "url": favourite_url.url,
+                    "status": "error",
+                    "errors": {"url": ["Saved by another request, try again"]},
+                }
+        saved = [(index, obj) for index, obj in saved if obj.pk is not None]
+        tags_to_set = [(obj, tags) for obj, tags in tags_to_set if obj.pk is not None]
+    FavouriteUrl.objects.bulk_update(
+        to_update, ["title", "category", "valid_url", "updated_at"]
+    )
+    updated_ids = {favourite_url.id for favourite_url in to_update}
+    FavouriteUrl.tags.through.objects.filter(
+        favouriteurl_id__in=[
+            favourite_url.id
+            for favourite_url, _ in tags_to_set
+            if favourite_url.id in updated_ids
+        ]
+    ).delete()
+    FavouriteUrl.tags.through.objects.bulk_create(
+        FavouriteUrl.tags.through(
+            favouriteurl_id=favourite_url.id, favouritetag_id=tag_id
+        )
+        for favourite_url, tags in tags_to_set
+        for tag_id in dict.fromkeys(tags)
+    )
+    update_search_vectors(
+        FavouriteUrl.objects.filter(id__in=[obj.id for _, obj in saved])
+    )
+    # None of the bulk writes above send the signals that do this
+    invalidate_user_cache(user.id)
+
+    for index, favourite_url in saved:
+        results[index]["id"] = favourite_url.id
+    return results
+
+
+@transaction.atomic
+def bulk_delete_favourite_urls(user, ids):
+    ids = list(dict.fromkeys(ids))
+    favourite_urls = FavouriteUrl.objects.filter(user=user, id__in=ids)
+    deleted_ids = set(favourite_urls.values_list("id", flat=True))
+    # The counter write commits with the delete; the cache is bumped once
+    with deferred_counts(), batched_invalidation():
+        FavouriteUrl.objects.filter(id__in=deleted_ids).delete()
+    return [
+        {"id": id, "status": "deleted" if id in deleted_ids else "not_found"}
+        for id in ids
+    ]
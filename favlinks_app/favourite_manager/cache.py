@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from redis.exceptions import RedisError
+from rest_framework.response import Response
+
+GENERATION_KEY = "favlinks:generation:{user_id}"
+RESPONSE_KEY = "favlinks:response:{user_id}:{generation}:{view}:{digest}"
+METRIC_KEY = "favlinks:response-cache:{view}:{outcome}"
+CACHED_VIEWS = ("favouriteurl", "favouritecategory", "favouritetag")
+
+logger = logging.getLogger(__name__)
+_batched = threading.local()
+
+
+def get_user_generation(user_id):
+    key = GENERATION_KEY.format(user_id=user_id)
+    try:
+        # Seeded from the clock so an evicted counter never reuses an old value
+        cache.add(key, time.time_ns(), timeout=None)
+        return cache.get(key)
+    except RedisError:
+        logger.warning("Response cache unavailable, serving uncached", exc_info=True)
+        return None
+
+
+def bump_user_generation(user_id):
+    try:
+        cache.incr(GENERATION_KEY.format(user_id=user_id))
+    except ValueError:
+        get_user_generation(user_id)
+    except RedisError:
+        # Entries written before the outage still expire with their timeout
+        logger.warning(
+            "Could not invalidate cached responses of user %s", user_id, exc_info=True
+        )
+
+
+def invalidate_user_cache(*user_ids):
+    pending = getattr(_batched, "user_ids", None)
+    if pending is not None:
+        pending.update(user_ids)
+        return
+    # Bumped once the write is visible: a read racing an open transaction
+    # must not cache the old rows under the new generation
+    for user_id in set(user_ids):
+        transaction.on_commit(lambda user_id=user_id: bump_user_generation(user_id))
+
+
+@contextmanager
+def batched_invalidation():
+    """Invalidates each user's responses once for all the writes in the block."""
+    if getattr(_batched, "user_ids", None) is not None:
+        yield
+        return
+
+    _batched.user_ids = set()
+    try:
+        yield
+        user_ids = _batched.user_ids
+    finally:
+        _batched.user_ids = None
+    invalidate_user_cache(*user_ids)
+
+
+def invalidate_valid_url_users(valid_url_ids):
+    from favourite_manager.models import FavouriteUrl
+
+    user_ids = (
+        FavouriteUrl.objects.filter(valid_url_id__in=valid_url_ids)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    invalidate_user_cache(*user_ids)
+
+
+def record_response_cache(view, outcome):
+    key = METRIC_KEY.format(view=view, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except RedisError:
+        pass
+
+
+def get_response_cache_metrics():
+    metrics = {}
+    for view in CACHED_VIEWS:
+        hits = cache.get(METRIC_KEY.format(view=view, outcome="hit"), 0)
+        misses = cache.get(METRIC_KEY.format(view=view, outcome="miss"), 0)
+        total = hits + misses
+        metrics[view] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else None,
+        }
+    return metrics
+
+
+class CachedResponseMixin:
+    """Caches list/retrieve responses per user until the user's next write."""
+
+    def get_response_cache_key(self, request):
+        generation = get_user_generation(request.user.id)
+        if generation is None:
+            return None
+        params = sorted(request.query_params.lists())
+        digest = hashlib.md5(
+            repr((request.get_host(), self.action, self.kwargs, params)).encode()
+        ).hexdigest()
+        return RESPONSE_KEY.format(
+            user_id=request.user.id,
+            generation=generation,
+            view=self.basename,
+            digest=digest,
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        # Fails open: without the cache every request is served from the database
+        key = self.get_response_cache_key(request)
+        if key is None:
+            response = handler(request, *args, **kwargs)
+            response["X-Cache"] = "BYPASS"
+            return response
+
+        try:
+            data = cache.get(key)
+        except RedisError:
+            logger.warning(
+                "Response cache unavailable, serving uncached", exc_info=True
+            )
+            data = None
+        if data is not None:
+            record_response_cache(self.basename, "hit")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            except RedisError:
+                logger.warning("Could not cache response", exc_info=True)
+        record_response_cache(self.basename, "miss")
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
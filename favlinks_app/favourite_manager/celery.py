@@ -1,11 +1,16 @@
-from celery import Celery
+import time
+
+from celery import Celery, chord
 from celery.schedules import crontab
+from celery.utils.log import get_task_logger
 from django.conf import settings
 
 app = Celery("favlinks-celery")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
+logger = get_task_logger(__name__)
+
 
 @app.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -17,18 +22,182 @@ def setup_periodic_tasks(sender, **kwargs):
         crontab(minute=0, hour="0"),  # Every day
         clean_up_invalid_validurl_instances.s(),
     )
+    sender.add_periodic_task(
+        crontab(minute=30, hour="0"),  # Every day
+        clean_up_import_placeholders.s(),
+    )
 
 
 @app.task()
 def validate_urls_and_update_titles():
+    from datetime import timedelta
+
+    from django.db import transaction
+    from django.utils import timezone
+
+    from favourite_manager.models import ValidUrl
+
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.URL_VALIDATION_MIN_INTERVAL)
+    chunk_size = settings.URL_VALIDATION_CHUNK_SIZE
+    chunks = []
+    claimed = 0
+    while claimed < settings.URL_VALIDATION_MAX_PER_RUN:
+        # Each chunk is claimed and leased in its own short transaction so an
+        # overlapping run neither dispatches it again nor waits on its locks
+        with transaction.atomic():
+            chunk_ids = list(
+                ValidUrl.objects.select_for_update(skip_locked=True)
+                .filter(next_check_at__lte=now)
+                .order_by("next_check_at")
+                .values_list("id", flat=True)[
+                    : min(chunk_size, settings.URL_VALIDATION_MAX_PER_RUN - claimed)
+                ]
+            )
+            ValidUrl.objects.filter(id__in=chunk_ids).update(next_check_at=lease_until)
+        if not chunk_ids:
+            break
+        claimed += len(chunk_ids)
+        chunks.append(validate_url_chunk.s(chunk_ids))
+
+    if chunks:
+        chord(chunks)(summarize_url_validation.s(started_at=time.time()))
+    return len(chunks)
+
+
+@app.task()
+def validate_url_chunk(valid_url_ids):
+    from favourite_manager.fetcher import UrlFetchEngine
     from favourite_manager.models import ValidUrl
 
-    for valid_url_obj in ValidUrl.objects.all():
+    started = time.monotonic()
+    valid_urls = ValidUrl.objects.filter(id__in=valid_url_ids).order_by("id")
+    stats = UrlFetchEngine().run(valid_urls)
+    stats["duration"] = time.monotonic() - started
+    return stats
+
+
+@app.task()
+def summarize_url_validation(chunk_stats, started_at=None):
+    summary = {"chunks": len(chunk_stats), "checked": 0, "changed": 0, "failed": 0}
+    for stats in chunk_stats:
+        for key in ("checked", "changed", "failed"):
+            summary[key] += stats[key]
+    summary["worker_duration"] = sum(stats["duration"] for stats in chunk_stats)
+    if started_at is not None:
+        summary["duration"] = time.time() - started_at
+
+    logger.info("URL revalidation finished: %s", summary)
+    return summary
+
+
+@app.task()
+def validate_urls_and_update_favourite_titles(valid_url_ids):
+    from django.db.models import OuterRef, Q, Subquery
+
+    from favourite_manager.cache import invalidate_valid_url_users
+    from favourite_manager.fetcher import UrlFetchEngine
+    from favourite_manager.models import FavouriteUrl, ValidUrl
+
+    valid_urls = ValidUrl.objects.filter(id__in=valid_url_ids).order_by("id")
+    stats = UrlFetchEngine().run(valid_urls)
+
+    # Same title fallback as validate_url_and_update_title, in one statement
+    titled_valid_urls = valid_urls.filter(is_valid=True).exclude(
+        Q(title__isnull=True) | Q(title="")
+    )
+    updated = FavouriteUrl.objects.filter(
+        Q(title__isnull=True) | Q(title=""), valid_url__in=titled_valid_urls
+    ).update(
+        title=Subquery(
+            ValidUrl.objects.filter(id=OuterRef("valid_url_id")).values("title")[:1]
+        )
+    )
+    if updated:
+        invalidate_valid_url_users(valid_url_ids)
+    return stats
+
+
+@app.task()
+def validate_url_and_update_title(valid_url_id, release_fetch_lock=False):
+    from django.db.models import Q
+
+    from favourite_manager import valid_url_cache
+    from favourite_manager.cache import invalidate_valid_url_users
+    from favourite_manager.models import FavouriteUrl, ValidUrl
+
+    valid_url_obj = ValidUrl.objects.filter(id=valid_url_id).first()
+    if valid_url_obj is None:
+        return
+
+    try:
         valid_url_obj.validate_url_and_get_title()
+    finally:
+        # Held by the validate endpoint from the moment it queued this task
+        if release_fetch_lock:
+            valid_url_cache.release_fetch_lock(valid_url_obj.url)
+    if valid_url_obj.is_valid and valid_url_obj.title:
+        # Favourites accepted while pending fall back to the fetched title
+        updated = FavouriteUrl.objects.filter(
+            Q(title__isnull=True) | Q(title=""), valid_url=valid_url_obj
+        ).update(title=valid_url_obj.title)
+        if updated:
+            invalidate_valid_url_users([valid_url_obj.id])
 
 
 @app.task()
 def clean_up_invalid_validurl_instances():
+    from datetime import timedelta
+
+    from django.utils import timezone
+
     from favourite_manager.models import ValidUrl
 
-    ValidUrl.objects.filter(is_valid=False).delete()
+    # Rows a favourite still points to keep their status and backoff history;
+    # only orphans that have been invalid or pending for a while are dropped
+    cutoff = timezone.now() - timedelta(seconds=settings.INVALID_URL_RETENTION)
+    deleted, _ = ValidUrl.objects.filter(
+        is_valid=False, updated_at__lt=cutoff, favourite_urls__isnull=True
+    ).delete()
+    return deleted
+
+
+@app.task()
+def import_bookmarks_file(user_id, path, bookmark_format):
+    from django.core.files.storage import default_storage
+
+    from favourite_manager.importer import BookmarkImporter, parse_bookmarks
+    from user_manager.models import User
+
+    try:
+        user = User.objects.filter(id=user_id).first()
+        if user is None:
+            return None
+        with default_storage.open(path, "rb") as fileobj:
+            stats = BookmarkImporter(user).run(
+                parse_bookmarks(fileobj, bookmark_format)
+            )
+    finally:
+        default_storage.delete(path)
+
+    logger.info("Bookmark import for user %s finished: %s", user_id, stats)
+    return stats
+
+
+@app.task()
+def clean_up_import_placeholders():
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from favourite_manager.importer import PLACEHOLDER_NAME_PATTERN
+    from favourite_manager.models import FavouriteCategory
+
+    # An import killed before it reached a folder's name leaves its placeholder
+    cutoff = timezone.now() - timedelta(
+        seconds=settings.BOOKMARK_IMPORT_PLACEHOLDER_RETENTION
+    )
+    deleted, _ = FavouriteCategory.objects.filter(
+        name__regex=PLACEHOLDER_NAME_PATTERN, created_at__lt=cutoff
+    ).delete()
+    return deleted
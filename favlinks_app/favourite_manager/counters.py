@@ -0,0 +1,111 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import F, OuterRef
+
+from favourite_manager.models import (
+    FavouriteCategory,
+    FavouriteStats,
+    FavouriteTag,
+    FavouriteUrl,
+    count_subquery,
+)
+from user_manager.models import User
+
+COUNTER_FIELDS = {
+    FavouriteUrl: "urls_count",
+    FavouriteTag: "tags_count",
+    FavouriteCategory: "categories_count",
+}
+
+_deferred = threading.local()
+
+
+def get_actual_counts():
+    return {
+        field: count_subquery(model.objects.filter(user=OuterRef("pk")), "user")
+        for model, field in COUNTER_FIELDS.items()
+    }
+
+
+def recount_user_stats(user_ids=None):
+    users = (
+        User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    )
+    FavouriteStats.objects.bulk_create(
+        [
+            FavouriteStats(user_id=user_id)
+            for user_id in users.filter(favourite_stats__isnull=True).values_list(
+                "pk", flat=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+    stats = FavouriteStats.objects.all()
+    if user_ids is not None:
+        stats = stats.filter(pk__in=user_ids)
+    actual_counts = get_actual_counts()
+    drifted_ids = list(
+        stats.annotate(
+            **{f"actual_{field}": count for field, count in actual_counts.items()}
+        )
+        .exclude(**{field: F(f"actual_{field}") for field in actual_counts})
+        .values_list("pk", flat=True)
+    )
+    # Counted again in the UPDATE so writes since the check are not lost
+    return FavouriteStats.objects.filter(pk__in=drifted_ids).update(**actual_counts)
+
+
+def write_counts(user_id, counts):
+    counts = {field: delta for field, delta in counts.items() if delta}
+    if not counts:
+        return
+    updated = FavouriteStats.objects.filter(pk=user_id).update(
+        **{field: F(field) + delta for field, delta in counts.items()}
+    )
+    if not updated:
+        # No stats row yet, so start it from the rows themselves
+        recount_user_stats([user_id])
+
+
+def adjust_counts(model, user_id, delta):
+    deltas = getattr(_deferred, "deltas", None)
+    if deltas is None:
+        write_counts(user_id, {COUNTER_FIELDS[model]: delta})
+    else:
+        deltas[user_id][COUNTER_FIELDS[model]] += delta
+
+
+@contextmanager
+def deferred_counts():
+    """Adds up counter changes made in the block and writes them once per user."""
+    if getattr(_deferred, "deltas", None) is not None:
+        yield
+        return
+
+    _deferred.deltas = defaultdict(Counter)
+    try:
+        yield
+        deltas = _deferred.deltas
+    finally:
+        _deferred.deltas = None
+    for user_id, counts in deltas.items():
+        write_counts(user_id, counts)
+
+
+def get_user_stats(user):
+    try:
+        return user.favourite_stats
+    except FavouriteStats.DoesNotExist:
+        recount_user_stats([user.pk])
+        return FavouriteStats.objects.get(pk=user.pk)
+
+
+def get_favourite_url_quota_left(user):
+    limit = settings.FAVOURITE_URLS_PER_USER_LIMIT
+    if limit is None:
+        return None
+    return max(limit - get_user_stats(user).urls_count, 0)
@@ -0,0 +1,16 @@
+from django.db import connections
+
+
+def iterate_queryset(queryset, chunk_size):
+    """Like QuerySet.iterator(), still reading in chunks without server-side cursors."""
+    if not connections[queryset.db].settings_dict.get("DISABLE_SERVER_SIDE_CURSORS"):
+        return queryset.iterator(chunk_size=chunk_size)
+    return iterate_by_ids(queryset, chunk_size)
+
+
+def iterate_by_ids(queryset, chunk_size):
+    # Behind a transaction-mode pooler a cursor cannot outlive its transaction,
+    # so the ids are read up front and the rows fetched one chunk per query
+    ids = list(queryset.prefetch_related(None).values_list("pk", flat=True))
+    for i in range(0, len(ids), chunk_size):
+        yield from queryset.filter(pk__in=ids[i : i + chunk_size])
@@ -0,0 +1,97 @@
+import csv
+import json
+
+from django.conf import settings
+from django.utils.html import escape
+
+from favourite_manager.cursors import iterate_queryset
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "html": ("text/html", "html"),
+}
+CSV_FIELDS = ["id", "url", "title", "category", "tags", "created_at", "updated_at"]
+
+
+def iter_favourite_urls(queryset, ordering=("id",), chunk_size=None):
+    # Prefetching runs once per chunk rather than once per row
+    return iterate_queryset(
+        queryset.select_related("category")
+        .prefetch_related("tags")
+        .order_by(*ordering),
+        chunk_size or settings.EXPORT_CHUNK_SIZE,
+    )
+
+
+def to_dict(favourite_url):
+    return {
+        "id": favourite_url.id,
+        "url": favourite_url.url,
+        "title": favourite_url.title,
+        "category": favourite_url.category.name if favourite_url.category else None,
+        "tags": [tag.name for tag in favourite_url.tags.all()],
+        "created_at": favourite_url.created_at.isoformat(),
+        "updated_at": favourite_url.updated_at.isoformat(),
+    }
+
+
+def export_ndjson(queryset, chunk_size=None):
+    for favourite_url in iter_favourite_urls(queryset, chunk_size=chunk_size):
+        yield json.dumps(to_dict(favourite_url)) + "\n"
+
+
+class LineBuffer:
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset, chunk_size=None):
+    writer = csv.DictWriter(LineBuffer(), fieldnames=CSV_FIELDS)
+    yield writer.writeheader()
+    for favourite_url in iter_favourite_urls(queryset, chunk_size=chunk_size):
+        row = to_dict(favourite_url)
+        row["tags"] = ",".join(row["tags"])
+        yield writer.writerow(row)
+
+
+def export_netscape_html(queryset, chunk_size=None):
+    yield (
+        "<!DOCTYPE NETSCAPE-Bookmark-file-1>\n"
+        '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+        "<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n"
+    )
+    # Ordered by category so each one is written as a single folder
+    favourite_urls = iter_favourite_urls(
+        queryset, ordering=("category_id", "id"), chunk_size=chunk_size
+    )
+    category_id = None
+    for favourite_url in favourite_urls:
+        if favourite_url.category_id != category_id:
+            if category_id is not None:
+                yield "    </DL><p>\n"
+            category_id = favourite_url.category_id
+            if category_id is not None:
+                yield "    <DT><H3>{}</H3>\n    <DL><p>\n".format(
+                    escape(favourite_url.category.name)
+                )
+        indent = "        " if category_id is not None else "    "
+        yield '{}<DT><A HREF="{}" ADD_DATE="{}" LAST_MODIFIED="{}" TAGS="{}">{}</A>\n'.format(
+            indent,
+            escape(favourite_url.url),
+            int(favourite_url.created_at.timestamp()),
+            int(favourite_url.updated_at.timestamp()),
+            escape(",".join(tag.name for tag in favourite_url.tags.all())),
+            escape(favourite_url.title or favourite_url.url),
+        )
+    if category_id is not None:
+        yield "    </DL><p>\n"
+    yield "</DL><p>\n"
+
+
+def export_favourite_urls(queryset, export_format, chunk_size=None):
+    if export_format == "csv":
+        return export_csv(queryset, chunk_size)
+    if export_format == "html":
+        return export_netscape_html(queryset, chunk_size)
+    return export_ndjson(queryset, chunk_size)
@@ -0,0 +1,129 @@
+import logging
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from favourite_manager import valid_url_cache
+from favourite_manager.cache import invalidate_valid_url_users
+from favourite_manager.cursors import iterate_queryset
+from favourite_manager.models import ValidUrl
+
+logger = logging.getLogger(__name__)
+
+
+class UrlFetchEngine:
+    """Revalidates ValidUrl rows concurrently and writes results back in batches."""
+
+    def __init__(
+        self,
+        concurrency=None,
+        per_host_concurrency=None,
+        timeout=None,
+        batch_size=None,
+    ):
+        self.concurrency = concurrency or settings.URL_VALIDATION_CONCURRENCY
+        self.per_host_concurrency = (
+            per_host_concurrency or settings.URL_VALIDATION_PER_HOST_CONCURRENCY
+        )
+        self.timeout = timeout
+        self.batch_size = batch_size or settings.URL_VALIDATION_BATCH_SIZE
+
+    def check(self, valid_url_obj):
+        previous = (valid_url_obj.is_valid, valid_url_obj.title)
+        try:
+            changed = valid_url_obj.check_url_and_get_title(timeout=self.timeout)
+        except Exception:
+            # One broken page must not lose the results collected for the others
+            logger.exception("Checking %s failed", valid_url_obj.url)
+            changed = valid_url_obj.record_failed_check(previous)
+        if changed:
+            valid_url_obj.updated_at = timezone.now()
+        return valid_url_obj, changed
+
+    def run(self, valid_urls=None):
+        if valid_urls is None:
+            valid_urls = ValidUrl.objects.order_by("id")
+        if hasattr(valid_urls, "iterator"):
+            valid_urls = iterate_queryset(valid_urls, self.batch_size)
+
+        stats = {"checked": 0, "changed": 0, "failed": 0}
+        changed_batch = []
+        unchanged_batch = []
+
+        def collect(futures):
+            for future in futures:
+                valid_url_obj, changed = future.result()
+                stats["checked"] += 1
+                stats["changed"] += int(changed)
+                stats["failed"] += int(not valid_url_obj.is_valid)
+                if changed:
+                    changed_batch.append(valid_url_obj)
+                else:
+                    unchanged_batch.append(valid_url_obj)
+            if len(changed_batch) + len(unchanged_batch) >= self.batch_size:
+                self.write(changed_batch, unchanged_batch)
+                changed_batch.clear()
+                unchanged_batch.clear()
+
+        # URLs only reach the pool once their host has a free slot, so a busy
+        # host never ties up workers that other hosts could use. The URLs
+        # waiting for a slot are bounded so memory stays flat.
+        max_waiting = self.concurrency * 2
+        waiting = defaultdict(deque)
+        active = Counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = {}
+
+            def submit_ready():
+                for host, queue in list(waiting.items()):
+                    while (
+                        queue
+                        and active[host] < self.per_host_concurrency
+                        and len(in_flight) < self.concurrency
+                    ):
+                        future = executor.submit(self.check, queue.popleft())
+                        in_flight[future] = host
+                        active[host] += 1
+                    if not queue:
+                        del waiting[host]
+
+            def wait_for_one():
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host = in_flight.pop(future)
+                    active[host] -= 1
+                    if not active[host]:
+                        del active[host]
+                collect(done)
+                submit_ready()
+
+            for valid_url_obj in valid_urls:
+                waiting[urlsplit(valid_url_obj.url).hostname or ""].append(
+                    valid_url_obj
+                )
+                submit_ready()
+                while sum(map(len, waiting.values())) >= max_waiting:
+                    wait_for_one()
+            while in_flight:
+                wait_for_one()
+
+        self.write(changed_batch, unchanged_batch)
+        return stats
+
+    def write(self, changed_batch, unchanged_batch):
+        # Unchanged pages only need their schedule and validators persisted
+        if changed_batch:
+            ValidUrl.objects.bulk_update(
+                changed_batch,
+                ValidUrl.content_fields + ValidUrl.check_fields,
+                batch_size=self.batch_size,
+            )
+            invalidate_valid_url_users([obj.id for obj in changed_batch])
+        if unchanged_batch:
+            ValidUrl.objects.bulk_update(
+                unchanged_batch, ValidUrl.check_fields, batch_size=self.batch_size
+            )
+        valid_url_cache.store_valid_urls(changed_batch + unchanged_batch)
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from .models import FavouriteUrl
+from .search import filter_similar_favourite_urls, search_favourite_urls
 
 
 class FavouriteUrlFilter(filters.FilterSet):
@@ -10,6 +11,12 @@ class FavouriteUrlFilter(filters.FilterSet):
     created_before = filters.DateTimeFilter(field_name="created_at", lookup_expr="lte")
     updated_after = filters.DateTimeFilter(field_name="updated_at", lookup_expr="gte")
     updated_before = filters.DateTimeFilter(field_name="updated_at", lookup_expr="lte")
+    is_valid = filters.BooleanFilter(field_name="valid_url__is_valid")
+    q = filters.CharFilter(method="filter_by_search_query")
+    similar = filters.CharFilter(method="filter_by_similarity")
+    similar_threshold = filters.NumberFilter(
+        method="filter_by_similarity_threshold", min_value=0, max_value=1
+    )
 
     class Meta:
         model = FavouriteUrl
@@ -21,7 +28,22 @@ class FavouriteUrlFilter(filters.FilterSet):
             "created_before",
             "updated_after",
             "updated_before",
+            "is_valid",
+            "q",
+            "similar",
+            "similar_threshold",
         ]
 
     def filter_by_category_name(self, queryset, name, value):
         return queryset.filter(category__name__icontains=value)
+
+    def filter_by_search_query(self, queryset, name, value):
+        return search_favourite_urls(queryset, value)
+
+    def filter_by_similarity(self, queryset, name, value):
+        threshold = self.form.cleaned_data.get("similar_threshold")
+        return filter_similar_favourite_urls(queryset, value, threshold)
+
+    def filter_by_similarity_threshold(self, queryset, name, value):
+        # Only tunes the "similar" filter
+        return queryset
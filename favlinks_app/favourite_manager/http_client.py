@@ -0,0 +1,48 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session():
+    retry = Retry(
+        total=settings.HTTP_CLIENT_RETRIES,
+        backoff_factor=settings.HTTP_CLIENT_BACKOFF_FACTOR,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_CLIENT_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_CLIENT_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.max_redirects = settings.HTTP_CLIENT_MAX_REDIRECTS
+    return session
+
+
+def get_session():
+    # Created lazily so every forked worker process gets its own pools
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def get(url, timeout=None, **kwargs):
+    if timeout is None:
+        timeout = (
+            settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+            settings.HTTP_CLIENT_READ_TIMEOUT,
+        )
+    return get_session().get(url, timeout=timeout, **kwargs)
@@ -0,0 +1,292 @@
+import codecs
+import os
+import uuid
+from html.parser import HTMLParser
+from itertools import islice
+
+import ijson
+from django.conf import settings
+from django.db import transaction
+
+from favourite_manager.bulk import bulk_save_favourite_urls
+from favourite_manager.counters import recount_user_stats
+from favourite_manager.models import FavouriteCategory, FavouriteTag, FavouriteUrl
+from favourite_manager.search import update_search_vectors
+from favourite_manager.serializers import FavouriteUrlBulkItemSerializer
+
+READ_CHUNK_SIZE = 64 * 1024
+BOOKMARK_FORMATS = ("html", "json")
+NAME_MAX_LENGTH = 255
+# Names of the categories holding a folder's favourites until its name is read
+PLACEHOLDER_NAME = "Importing {}"
+PLACEHOLDER_NAME_PATTERN = r"^Importing [0-9a-f]{32}$"
+
+
+def clean_name(name):
+    if not isinstance(name, str):
+        return None
+    return name.strip()[:NAME_MAX_LENGTH] or None
+
+
+def split_tags(tags):
+    if not isinstance(tags, str):
+        return []
+    return [tag for tag in map(clean_name, tags.split(",")) if tag]
+
+
+class NetscapeBookmarkParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.entries = []
+        self.folders = []
+        self.next_folder = None
+        self.link = None
+        self.text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self.text = []
+        elif tag == "a":
+            self.link = dict(attrs)
+            self.text = []
+        elif tag == "dl":
+            # A <DL> holds the contents of the <H3> folder just before it
+            self.folders.append(self.next_folder)
+            self.next_folder = None
+
+    def handle_endtag(self, tag):
+        if tag == "h3" and self.text is not None:
+            self.next_folder = clean_name("".join(self.text))
+            self.text = None
+        elif tag == "a" and self.link is not None:
+            self.entries.append(
+                {
+                    "url": self.link.get("href") or "",
+                    "title": "".join(self.text).strip(),
+                    "folder": next((f for f in reversed(self.folders) if f), None),
+                    "tags": split_tags(self.link.get("tags")),
+                }
+            )
+            self.link = None
+            self.text = None
+        elif tag == "dl" and self.folders:
+            self.folders.pop()
+
+    def handle_data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+
+def parse_netscape_html(fileobj):
+    parser = NetscapeBookmarkParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = fileobj.read(READ_CHUNK_SIZE)
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk, final=not chunk)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        yield from parser.entries
+        parser.entries.clear()
+        if not chunk:
+            return
+
+
+class PendingFolder:
+    """A JSON folder whose name comes after its children, as Chrome writes it.
+
+    Entries are yielded with the folder itself; its name is filled in (and
+    `closed` set) once the parser reaches the end of the folder.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.closed = False
+
+
+def parse_bookmarks_json(fileobj):
+    """Chrome ("name"/"url") and Firefox ("title"/"uri") bookmark trees."""
+    frames = []
+    for prefix, event, value in ijson.parse(fileobj):
+        if event == "start_map":
+            # Only members of a children array (or maps typed as a URL) are
+            # bookmarks; other objects may carry a "url" too, e.g. meta_info
+            in_children = prefix == "children.item" or prefix.endswith(".children.item")
+            frames.append(
+                {"key": None, "fields": {}, "folder": None, "in_children": in_children}
+            )
+        elif event == "map_key":
+            frames[-1]["key"] = value
+        elif event == "start_array" and frames and frames[-1]["key"] == "children":
+            frames[-1]["folder"] = PendingFolder()
+        elif event == "end_map":
+            frame = frames.pop()
+            entry = None
+            if frame["in_children"] or frame["fields"].get("type") == "url":
+                entry = get_json_entry(frame["fields"])
+            if entry is not None:
+                folder = next((f for f in reversed(frames) if f["folder"]), None)
+                if folder is not None:
+                    # Streamed out straight away rather than held until the
+                    # name turns up, so memory stays bounded by the depth
+                    entry["folder"] = (
+                        get_json_folder_name(folder["fields"]) or folder["folder"]
+                    )
+                yield entry
+            if frame["folder"] is not None:
+                frame["folder"].name = get_json_folder_name(frame["fields"])
+                frame["folder"].closed = True
+        elif frames and prefix.rsplit(".", 1)[-1] == frames[-1]["key"]:
+            frames[-1]["fields"][frames[-1]["key"]] = value
+
+
+def get_json_entry(fields):
+    url = fields.get("url") or fields.get("uri")
+    if not isinstance(url, str):
+        return None
+    return {
+        "url": url,
+        "title": str(fields.get("title") or fields.get("name") or "").strip(),
+        "folder": None,
+        "tags": split_tags(fields.get("tags")),
+    }
+
+
+def get_json_folder_name(fields):
+    return clean_name(fields.get("title") or fields.get("name"))
+
+
+def get_bookmark_format(filename, bookmark_format=None):
+    if bookmark_format:
+        return bookmark_format
+    extension = os.path.splitext(filename or "")[1].lower()
+    return "json" if extension == ".json" else "html"
+
+
+def parse_bookmarks(fileobj, bookmark_format):
+    if bookmark_format == "json":
+        return parse_bookmarks_json(fileobj)
+    return parse_netscape_html(fileobj)
+
+
+class BookmarkImporter:
+    """Writes parsed bookmarks in batches, one transaction per batch."""
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.BOOKMARK_IMPORT_BATCH_SIZE
+        self.category_ids = {}
+        self.tag_ids = {}
+        self.placeholders = {}
+
+    def run(self, entries):
+        stats = {"created": 0, "updated": 0, "failed": 0}
+        entries = iter(entries)
+        try:
+            while True:
+                batch = list(islice(entries, self.batch_size))
+                if not batch:
+                    break
+                for result in self.write(batch):
+                    if result["status"] == "error":
+                        stats["failed"] += 1
+                    else:
+                        stats[result["status"]] += 1
+                self.settle_placeholders()
+        finally:
+            # Folders left open by a broken file end up without a name; a
+            # killed process leaves its placeholders to
+            # clean_up_import_placeholders
+            self.settle_placeholders(everything=True)
+        # Folders and tags are bulk created without knowing how many are new
+        recount_user_stats([self.user.id])
+        return stats
+
+    def write(self, batch):
+        for entry in batch:
+            if isinstance(entry["folder"], PendingFolder):
+                if entry["folder"].closed:
+                    entry["folder"] = entry["folder"].name
+                elif entry["folder"] not in self.placeholders:
+                    self.placeholders[entry["folder"]] = self.create_placeholder()
+        self.resolve_names(
+            FavouriteCategory,
+            self.category_ids,
+            {entry["folder"] for entry in batch if isinstance(entry["folder"], str)},
+        )
+        self.resolve_names(
+            FavouriteTag,
+            self.tag_ids,
+            {tag for entry in batch for tag in entry["tags"]},
+        )
+
+        items = []
+        results = []
+        for entry in batch:
+            # Favourites imported again keep what the export does not mention
+            item = {"url": entry["url"]}
+            if isinstance(entry["folder"], PendingFolder):
+                item["category"] = self.placeholders[entry["folder"]].id
+            elif entry["folder"]:
+                item["category"] = self.category_ids[entry["folder"]]
+            if entry["tags"]:
+                item["tags"] = [self.tag_ids[tag] for tag in entry["tags"]]
+            if entry["title"]:
+                item["title"] = entry["title"][:255]
+            serializer = FavouriteUrlBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                items.append(serializer.validated_data)
+            else:
+                results.append({"status": "error", "errors": serializer.errors})
+        return results + bulk_save_favourite_urls(self.user, items)
+
+    def resolve_names(self, model, ids_by_name, names):
+        names = names - ids_by_name.keys()
+        if not names:
+            return
+        model.objects.bulk_create(
+            [model(user=self.user, name=name) for name in names],
+            ignore_conflicts=True,
+        )
+        ids_by_name.update(
+            model.objects.filter(user=self.user, name__in=names).values_list(
+                "name", "id"
+            )
+        )
+
+    def create_placeholder(self):
+        # Holds a folder's favourites until the parser reaches its name
+        return FavouriteCategory.objects.create(
+            user=self.user, name=PLACEHOLDER_NAME.format(uuid.uuid4().hex)
+        )
+
+    def settle_placeholders(self, everything=False):
+        for folder, category in list(self.placeholders.items()):
+            if folder.closed or everything:
+                with transaction.atomic():
+                    self.settle_placeholder(folder.name, category)
+                del self.placeholders[folder]
+
+    def settle_placeholder(self, name, category):
+        if name is None:
+            category.delete()
+            return
+        existing_id = self.category_ids.get(name)
+        if existing_id is None:
+            existing_id = (
+                FavouriteCategory.objects.filter(user=self.user, name=name)
+                .values_list("id", flat=True)
+                .first()
+            )
+        if existing_id is None:
+            category.name = name
+            category.save()
+            self.category_ids[name] = category.id
+            return
+        # Another batch or an earlier import already created the folder
+        FavouriteUrl.objects.filter(category=category).update(category_id=existing_id)
+        update_search_vectors(FavouriteUrl.objects.filter(category_id=existing_id))
+        category.delete()
+        self.category_ids[name] = existing_id
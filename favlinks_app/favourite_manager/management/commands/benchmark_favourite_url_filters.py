@@ -0,0 +1,206 @@
+import random
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from favourite_manager.filters import FavouriteUrlFilter
+from favourite_manager.models import (
+    FavouriteCategory,
+    FavouriteTag,
+    FavouriteUrl,
+    ValidUrl,
+)
+from favourite_manager.search import update_search_vectors
+from user_manager.models import User
+
+WORDS = [
+    "python",
+    "django",
+    "recipes",
+    "travel",
+    "news",
+    "music",
+    "design",
+    "postgres",
+    "docs",
+    "tutorial",
+    "video",
+    "blog",
+    "finance",
+    "sports",
+    "science",
+    "games",
+    "shopping",
+    "weather",
+    "maps",
+    "research",
+]
+CATEGORIES_PER_USER = 10
+TAGS_PER_USER = 20
+PAGE_SIZE = 10
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed favourite URLs and EXPLAIN ANALYZE every FavouriteUrlFilter combination"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--urls-per-user", type=int, default=2000)
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the seeded data afterwards"
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="Print the full query plans"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options)
+                self.report(user, options["plans"])
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write("Seeded data rolled back")
+
+    def seed(self, options):
+        suffix = timezone.now().strftime("%Y%m%d%H%M%S")
+        users = User.objects.bulk_create(
+            User(username=f"benchmark-{suffix}-{i}") for i in range(options["users"])
+        )
+        categories = FavouriteCategory.objects.bulk_create(
+            FavouriteCategory(user=user, name=f"{random.choice(WORDS)} {i}")
+            for user in users
+            for i in range(CATEGORIES_PER_USER)
+        )
+        tags = FavouriteTag.objects.bulk_create(
+            FavouriteTag(user=user, name=f"{random.choice(WORDS)} {i}")
+            for user in users
+            for i in range(TAGS_PER_USER)
+        )
+        categories_by_user = group_by_user(categories)
+        tags_by_user = group_by_user(tags)
+
+        # Every user bookmarks the same URLs, so ValidUrls are shared
+        urls = [
+            f"https://{random.choice(WORDS)}{i % 500}.example.com/{suffix}/{i}"
+            for i in range(options["urls_per_user"])
+        ]
+        valid_urls = ValidUrl.objects.bulk_create(
+            (ValidUrl(url=url, is_valid=random.random() < 0.9) for url in urls),
+            batch_size=1000,
+        )
+        favourite_urls = FavouriteUrl.objects.bulk_create(
+            (
+                FavouriteUrl(
+                    user=user,
+                    url=valid_url.url,
+                    title=" ".join(random.sample(WORDS, 3)),
+                    category=random.choice(categories_by_user[user.id] + [None]),
+                    valid_url=valid_url,
+                )
+                for user in users
+                for valid_url in valid_urls
+            ),
+            batch_size=1000,
+        )
+        FavouriteUrl.tags.through.objects.bulk_create(
+            (
+                FavouriteUrl.tags.through(
+                    favouriteurl_id=favourite_url.id, favouritetag_id=tag.id
+                )
+                for favourite_url in favourite_urls
+                for tag in random.sample(tags_by_user[favourite_url.user_id], 2)
+            ),
+            batch_size=1000,
+        )
+
+        seeded = FavouriteUrl.objects.filter(user__in=users)
+        seeded.update(
+            created_at=RawSQL("now() - random() * interval '365 days'", []),
+            updated_at=RawSQL("now() - random() * interval '30 days'", []),
+        )
+        update_search_vectors(seeded)
+        with connection.cursor() as cursor:
+            for model in (FavouriteUrl, FavouriteCategory, FavouriteTag, ValidUrl):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+            cursor.execute(f"ANALYZE {FavouriteUrl.tags.through._meta.db_table}")
+
+        self.stdout.write(
+            f"Seeded {len(users)} users with {len(favourite_urls)} favourite URLs"
+        )
+        return users[0]
+
+    def get_cases(self, user):
+        favourite_url = FavouriteUrl.objects.filter(user=user).first()
+        category = FavouriteCategory.objects.filter(user=user).first()
+        word = favourite_url.title.split()[0]
+        now = timezone.now()
+        week_ago = (now - timedelta(days=7)).isoformat()
+        month_ago = (now - timedelta(days=30)).isoformat()
+
+        cases = [
+            ("no filters", {}),
+            ("title", {"title": word}),
+            ("url", {"url": favourite_url.url.split("/")[2]}),
+            ("category_name", {"category_name": category.name}),
+            ("created_after", {"created_after": week_ago}),
+            ("created_before", {"created_before": month_ago}),
+            ("updated_after", {"updated_after": week_ago}),
+            ("updated_before", {"updated_before": month_ago}),
+            ("is_valid", {"is_valid": "false"}),
+            ("q", {"q": word}),
+            ("similar", {"similar": word[:-1]}),
+            (
+                "created_after + category_name",
+                {"created_after": month_ago, "category_name": category.name},
+            ),
+            ("title + is_valid", {"title": word, "is_valid": "true"}),
+            ("updated range", {"updated_after": month_ago, "updated_before": week_ago}),
+        ]
+        for ordering in ("-created_at", "-updated_at", "title"):
+            cases.append((f"ordering {ordering}", {"ordering": ordering}))
+        return cases
+
+    def get_queryset(self, user, params):
+        queryset = FavouriteUrl.objects.filter(user=user)
+        params = dict(params)
+        ordering = params.pop("ordering", None)
+        queryset = FavouriteUrlFilter(params, queryset=queryset).qs
+        if ordering:
+            id_ordering = "-id" if ordering.startswith("-") else "id"
+            queryset = queryset.order_by(ordering, id_ordering)
+        return queryset[:PAGE_SIZE]
+
+    def report(self, user, show_plans):
+        table = FavouriteUrl._meta.db_table
+        for label, params in self.get_cases(user):
+            plan = self.get_queryset(user, params).explain(analyze=True)
+            execution_time = re.search(r"Execution Time: ([\d.]+) ms", plan)
+            seq_scan = f"Seq Scan on {table}" in plan
+            self.stdout.write(
+                "{:<35} {:>10} ms  {}".format(
+                    label,
+                    execution_time.group(1) if execution_time else "?",
+                    self.style.WARNING("seq scan") if seq_scan else "index",
+                )
+            )
+            if show_plans:
+                self.stdout.write(plan + "\n")
+
+
+def group_by_user(objs):
+    grouped = {}
+    for obj in objs:
+        grouped.setdefault(obj.user_id, []).append(obj)
+    return grouped
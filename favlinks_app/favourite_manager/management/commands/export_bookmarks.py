@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from favourite_manager.exporter import EXPORT_FORMATS, export_favourite_urls
+from favourite_manager.models import FavouriteUrl
+from user_manager.models import User
+
+
+class Command(BaseCommand):
+    help = "Export a user's favourite URLs as NDJSON, CSV or Netscape HTML"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", type=str, help="User to export")
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument(
+            "--output", type=str, help="File to write, stdout by default"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, help="Rows fetched per database round trip"
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        lines = export_favourite_urls(
+            FavouriteUrl.objects.filter(user=user),
+            options["format"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from favourite_manager.importer import (
+    BOOKMARK_FORMATS,
+    BookmarkImporter,
+    get_bookmark_format,
+    parse_bookmarks,
+)
+from user_manager.models import User
+
+
+class Command(BaseCommand):
+    help = "Import a Netscape HTML or JSON bookmarks export for a user"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", type=str, help="User to import for")
+        parser.add_argument("path", type=str, help="Bookmarks export file")
+        parser.add_argument(
+            "--format",
+            choices=BOOKMARK_FORMATS,
+            help="Export format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Bookmarks written per transaction"
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        bookmark_format = get_bookmark_format(options["path"], options["format"])
+        importer = BookmarkImporter(user, batch_size=options["batch_size"])
+        with open(options["path"], "rb") as fileobj:
+            stats = importer.run(parse_bookmarks(fileobj, bookmark_format))
+
+        self.stdout.write(
+            "Created: {created}, Updated: {updated}, Failed: {failed}".format(**stats)
+        )
@@ -0,0 +1,76 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+
+from user_manager.models import User
+
+
+class Command(BaseCommand):
+    help = "Send concurrent GET requests to a running server and report requests/sec"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", default="http://localhost:8000/api/favouriteurl/?page_size=20"
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--user",
+            help="Username to send requests as, through a session created for it",
+        )
+
+    def create_session(self, username):
+        # Basic auth would hash the password on every request and drown the result
+        user = User.objects.get(username=username)
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def handle(self, *args, **options):
+        sessions = threading.local()
+        cookies = {}
+        if options["user"]:
+            cookies[settings.SESSION_COOKIE_NAME] = self.create_session(options["user"])
+
+        def fetch(_):
+            # One keep-alive connection per client thread
+            if not hasattr(sessions, "session"):
+                sessions.session = requests.Session()
+                sessions.session.cookies.update(cookies)
+            start = time.perf_counter()
+            try:
+                response = sessions.session.get(options["url"], timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return ok, time.perf_counter() - start
+
+        # Warm up every worker process before measuring
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            list(pool.map(fetch, range(options["concurrency"] * 2)))
+
+            started = time.perf_counter()
+            results = list(pool.map(fetch, range(options["requests"])))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for _, latency in results)
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(f"Requests:      {len(results)}")
+        self.stdout.write(f"Concurrency:   {options['concurrency']}")
+        self.stdout.write(f"Failed:        {sum(not ok for ok, _ in results)}")
+        self.stdout.write(f"Requests/sec:  {len(results) / elapsed:.1f}")
+        self.stdout.write(
+            "Latency (ms):  p50 {:.1f}, p95 {:.1f}, p99 {:.1f}".format(
+                percentiles[49], percentiles[94], percentiles[98]
+            )
+        )
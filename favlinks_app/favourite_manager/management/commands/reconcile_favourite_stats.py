@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from favourite_manager.counters import recount_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recount the per-user favourite URL, tag and category counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="user_ids", help="User id"
+        )
+
+    def handle(self, *args, **options):
+        fixed = recount_user_stats(options["user_ids"])
+        self.stdout.write(f"Reconciled the counters of {fixed} user(s)")
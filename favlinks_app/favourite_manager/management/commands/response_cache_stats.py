@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from favourite_manager.cache import get_response_cache_metrics
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counts of the per-user response cache"
+
+    def handle(self, *args, **options):
+        for view, metrics in get_response_cache_metrics().items():
+            hit_ratio = metrics["hit_ratio"]
+            self.stdout.write(
+                "{}: {} hits, {} misses, hit ratio {}".format(
+                    view,
+                    metrics["hits"],
+                    metrics["misses"],
+                    "-" if hit_ratio is None else f"{hit_ratio:.1%}",
+                )
+            )
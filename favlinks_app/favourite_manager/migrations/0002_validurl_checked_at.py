@@ -0,0 +1,26 @@
+# Generated by Django 4.1.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_checked_at(apps, schema_editor):
+    # Every existing row was validated synchronously when it was created.
+    ValidUrl = apps.get_model("favourite_manager", "ValidUrl")
+    ValidUrl.objects.filter(checked_at__isnull=True).update(checked_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validurl',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_checked_at, migrations.RunPython.noop),
+    ]
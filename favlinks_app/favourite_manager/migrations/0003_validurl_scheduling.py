@@ -0,0 +1,29 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0002_validurl_checked_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validurl',
+            name='consecutive_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='validurl',
+            name='last_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='validurl',
+            name='next_check_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0003_validurl_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validurl',
+            name='etag',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='validurl',
+            name='last_modified',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_valid_url(apps, schema_editor):
+    FavouriteUrl = apps.get_model("favourite_manager", "FavouriteUrl")
+    ValidUrl = apps.get_model("favourite_manager", "ValidUrl")
+    FavouriteUrl.objects.update(
+        valid_url=Subquery(
+            ValidUrl.objects.filter(url=OuterRef("url")).values("id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0004_validurl_etag_last_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favouriteurl',
+            name='valid_url',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='favourite_urls', to='favourite_manager.validurl'),
+        ),
+        migrations.RunPython(backfill_valid_url, migrations.RunPython.noop),
+    ]
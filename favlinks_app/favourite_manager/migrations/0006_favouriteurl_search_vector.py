@@ -0,0 +1,66 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.models import Max, Min
+
+BACKFILL_BATCH_SIZE = 10000
+
+# The search vector as it was defined when the field was added
+BACKFILL_SQL = """
+UPDATE {favouriteurl} f SET search_vector =
+    setweight(to_tsvector('english', COALESCE(f.title, '')), 'A')
+    || setweight(to_tsvector('english',
+        COALESCE((SELECT c.name FROM {favouritecategory} c WHERE c.id = f.category_id), '')
+        || ' ' ||
+        COALESCE((SELECT STRING_AGG(t.name, ' ') FROM {tags} ft
+                  JOIN {favouritetag} t ON t.id = ft.favouritetag_id
+                  WHERE ft.favouriteurl_id = f.id), '')
+    ), 'B')
+    || setweight(to_tsvector('english',
+        COALESCE(regexp_replace(f.url, '[^[:alnum:]]+', ' ', 'g'), '')
+    ), 'C')
+WHERE f.id >= %s AND f.id < %s
+"""
+
+
+def backfill_search_vector(apps, schema_editor):
+    FavouriteUrl = apps.get_model('favourite_manager', 'FavouriteUrl')
+    FavouriteCategory = apps.get_model('favourite_manager', 'FavouriteCategory')
+    FavouriteTag = apps.get_model('favourite_manager', 'FavouriteTag')
+    quote = schema_editor.quote_name
+    sql = BACKFILL_SQL.format(
+        favouriteurl=quote(FavouriteUrl._meta.db_table),
+        favouritecategory=quote(FavouriteCategory._meta.db_table),
+        favouritetag=quote(FavouriteTag._meta.db_table),
+        tags=quote(FavouriteUrl.tags.through._meta.db_table),
+    )
+    bounds = FavouriteUrl.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    # One short UPDATE per id range rather than the whole table at once
+    for start in range(bounds['low'], bounds['high'] + 1, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(sql, [start, start + BACKFILL_BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    # Each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('favourite_manager', '0005_favouriteurl_valid_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favouriteurl',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='favourite_m_search__79125a_gin'),
+        ),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:50
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0006_favouriteurl_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='favouritecategory',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='favouritecategory_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='favouriteurl_title_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('url'), name='gin_trgm_ops'), name='favouriteurl_url_trgm'),
+        ),
+    ]
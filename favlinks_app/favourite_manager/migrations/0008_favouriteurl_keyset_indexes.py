@@ -0,0 +1,25 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0007_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='favouriteurl_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='favouriteurl_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(fields=['user', 'title', 'id'], name='favouriteurl_user_title_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('favourite_manager', '0008_favouriteurl_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(fields=['user', 'category'], name='favouriteurl_user_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(fields=['user', 'valid_url'], name='favouriteurl_user_validurl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(condition=models.Q(('valid_url__isnull', True)), fields=['url'], name='favouriteurl_unlinked_url_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favouriteurl',
+            index=models.Index(condition=models.Q(('title__isnull', True), ('title', ''), _connector='OR'), fields=['valid_url'], name='favouriteurl_untitled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='validurl',
+            index=models.Index(condition=models.Q(('is_valid', False)), fields=['id'], name='validurl_invalid_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_favourite_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    FavouriteStats = apps.get_model("favourite_manager", "FavouriteStats")
+    FavouriteStats.objects.bulk_create(
+        [FavouriteStats(user_id=pk) for pk in User.objects.values_list("pk", flat=True)],
+        batch_size=1000,
+    )
+    counts = {}
+    for field, model_name in [
+        ("urls_count", "FavouriteUrl"),
+        ("tags_count", "FavouriteTag"),
+        ("categories_count", "FavouriteCategory"),
+    ]:
+        model = apps.get_model("favourite_manager", model_name)
+        user_counts = (
+            model.objects.filter(user=OuterRef("pk"))
+            .order_by()
+            .values("user")
+            .annotate(count=Count("*"))
+        )
+        counts[field] = Coalesce(
+            Subquery(user_counts.values("count")), 0, output_field=models.IntegerField()
+        )
+    FavouriteStats.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('favourite_manager', '0009_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavouriteStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='favourite_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('urls_count', models.IntegerField(default=0)),
+                ('tags_count', models.IntegerField(default=0)),
+                ('categories_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Favourite Stats',
+                'verbose_name_plural': 'Favourite Stats',
+            },
+        ),
+        migrations.RunPython(backfill_favourite_stats, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,97 @@
+from datetime import timedelta
 from unicodedata import category
 from bs4 import BeautifulSoup
 import requests
 
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from favourite_manager import http_client, valid_url_cache
+from favourite_manager.title_extractor import (
+    get_declared_charset,
+    is_html_response,
+    read_html_head,
+)
 from user_manager.models import User
 
 
+def count_subquery(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(count=models.Count("*"))
+    return Coalesce(
+        models.Subquery(counts.values("count")), 0, output_field=models.IntegerField()
+    )
+
+
+TAG_OWNER_ERROR = "Tag must belong to the same user."
+CATEGORY_OWNER_ERROR = "Category must belong to the same user."
+
+
+def get_owned_ids(model, user_id, objs):
+    # Instances or primary keys, checked with one query however many there are
+    ids = {getattr(obj, "pk", obj) for obj in objs}
+    if not ids:
+        return set()
+    return set(
+        model.objects.filter(user_id=user_id, pk__in=ids).values_list("pk", flat=True)
+    )
+
+
+def check_owned(model, user_id, objs, message):
+    ids = {getattr(obj, "pk", obj) for obj in objs}
+    if len(get_owned_ids(model, user_id, ids)) != len(ids):
+        raise ValidationError(message)
+
+
+class FavouriteCategoryQuerySet(models.QuerySet):
+    def with_urls_count(self):
+        return self.annotate(
+            urls_count=count_subquery(
+                FavouriteUrl.objects.filter(category=models.OuterRef("pk")),
+                "category",
+            )
+        )
+
+
+class FavouriteTagQuerySet(models.QuerySet):
+    def with_urls_count(self):
+        # A correlated subquery stays correct inside prefetches, which filter
+        # tags through the same join a Count() would reuse
+        return self.annotate(
+            urls_count=count_subquery(
+                FavouriteUrl.tags.through.objects.filter(
+                    favouritetag=models.OuterRef("pk")
+                ),
+                "favouritetag",
+            )
+        )
+
+
 class FavouriteCategory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(_("Category Name"), max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FavouriteCategoryQuerySet.as_manager()
+
     @property
     def associated_urls_count(self):
+        if hasattr(self, "urls_count"):
+            return self.urls_count
         return FavouriteUrl.objects.filter(category=self).count()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -26,6 +99,12 @@ class FavouriteCategory(models.Model):
         verbose_name = _("Favourite Category")
         verbose_name_plural = _("Favourite Categories")
         unique_together = ("user", "name")
+        indexes = [
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="favouritecategory_name_trgm",
+            )
+        ]
 
 
 class FavouriteTag(models.Model):
@@ -34,10 +113,20 @@ class FavouriteTag(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FavouriteTagQuerySet.as_manager()
+
     @property
     def associated_urls_count(self):
+        if hasattr(self, "urls_count"):
+            return self.urls_count
         return FavouriteUrl.objects.filter(tags__in=[self]).count()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
     def __str__(self):
         return self.name
 
@@ -47,28 +136,163 @@ class FavouriteTag(models.Model):
         unique_together = ("user", "name")
 
 
+def get_validator_header(response, name, max_length):
+    # Validators that cannot be stored intact are dropped rather than truncated
+    value = response.headers.get(name)
+    if isinstance(value, str) and len(value) <= max_length:
+        return value
+    return None
+
+
+class ValidationStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    VALID = "valid", _("Valid")
+    INVALID = "invalid", _("Invalid")
+
+    @classmethod
+    def from_check(cls, checked_at, is_valid):
+        if checked_at is None:
+            return cls.PENDING
+        if is_valid:
+            return cls.VALID
+        return cls.INVALID
+
+
 class ValidUrl(models.Model):
     url = models.URLField(unique=True)
     title = models.CharField(_("Title"), max_length=255, blank=True, null=True)
     is_valid = models.BooleanField(default=False)
+    checked_at = models.DateTimeField(blank=True, null=True)
+    next_check_at = models.DateTimeField(default=timezone.now, db_index=True)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    last_changed_at = models.DateTimeField(blank=True, null=True)
+    etag = models.CharField(max_length=255, blank=True, null=True)
+    last_modified = models.CharField(max_length=64, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Written after every check, even when the page turned out unchanged
+    check_fields = [
+        "checked_at",
+        "next_check_at",
+        "consecutive_failures",
+        "last_changed_at",
+        "etag",
+        "last_modified",
+    ]
+    content_fields = ["title", "is_valid", "updated_at"]
+
+    class Meta:
+        indexes = [
+            # Only the rows the clean-up task deletes
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_valid=False),
+                name="validurl_invalid_idx",
+            )
+        ]
+
     def __str__(self):
         return self.url
 
-    def validate_url_and_get_title(self) -> None:
+    @property
+    def validation_status(self):
+        return ValidationStatus.from_check(self.checked_at, self.is_valid)
+
+    def is_fresh(self, max_age=None) -> bool:
+        if self.checked_at is None:
+            return False
+        if max_age is None:
+            max_age = settings.URL_VALIDATION_FRESHNESS
+        return self.checked_at >= timezone.now() - timedelta(seconds=max_age)
+
+    def get_conditional_headers(self):
+        headers = {}
+        # Only a page already known to be valid can be answered with 304
+        if self.is_valid:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    @staticmethod
+    def get_title(response) -> str:
+        if not is_html_response(response):
+            return ""
+        # Only the start of the document is read, enough to reach the title
+        head = read_html_head(response, settings.URL_TITLE_MAX_BYTES)
+        soup = BeautifulSoup(
+            head, "html.parser", from_encoding=get_declared_charset(response)
+        )
+        title = soup.title.string if soup.title else ""
+        # Kept within the column so one long title cannot fail a bulk update
+        return title[: ValidUrl._meta.get_field("title").max_length] if title else title
+
+    def check_url_and_get_title(self, timeout=None) -> bool:
+        previous = (self.is_valid, self.title)
         try:
-            response = requests.get(self.url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                self.title = soup.title.string if soup.title else ""
-                self.is_valid = True
-            else:
-                self.is_valid = False
-            self.save()
+            response = http_client.get(
+                self.url,
+                timeout=timeout,
+                headers=self.get_conditional_headers(),
+                stream=True,
+            )
+            try:
+                if response.status_code == 304:
+                    self.is_valid = True
+                elif response.status_code == 200:
+                    self.title = self.get_title(response)
+                    self.is_valid = True
+                    self.etag = get_validator_header(response, "ETag", 255)
+                    self.last_modified = get_validator_header(
+                        response, "Last-Modified", 64
+                    )
+                else:
+                    self.is_valid = False
+            finally:
+                response.close()
         except requests.RequestException:
             self.is_valid = False
+        return self.finish_check(previous)
+
+    def record_failed_check(self, previous) -> bool:
+        # For errors other than the request failing, e.g. a broken page
+        self.is_valid, self.title = False, previous[1]
+        return self.finish_check(previous)
+
+    def finish_check(self, previous) -> bool:
+        self.checked_at = timezone.now()
+        changed = previous != (self.is_valid, self.title)
+        self.schedule_next_check(changed)
+        return changed
+
+    def schedule_next_check(self, changed) -> None:
+        if changed or self.last_changed_at is None:
+            self.last_changed_at = self.checked_at
+
+        if self.is_valid:
+            self.consecutive_failures = 0
+            # Pages that have stayed the same for longer are checked less often
+            stable_for = self.checked_at - self.last_changed_at
+            interval = stable_for.total_seconds() / 2
+        else:
+            self.consecutive_failures += 1
+            interval = settings.URL_VALIDATION_MIN_INTERVAL * 2 ** (
+                self.consecutive_failures - 1
+            )
+
+        interval = min(
+            max(interval, settings.URL_VALIDATION_MIN_INTERVAL),
+            settings.URL_VALIDATION_MAX_INTERVAL,
+        )
+        self.next_check_at = self.checked_at + timedelta(seconds=interval)
+
+    def validate_url_and_get_title(self) -> None:
+        changed = self.check_url_and_get_title()
+        if changed:
             self.save()
+        else:
+            self.save(update_fields=self.check_fields)
 
 
 class FavouriteUrl(models.Model):
@@ -79,38 +303,143 @@ class FavouriteUrl(models.Model):
         FavouriteCategory, blank=True, null=True, on_delete=models.SET_NULL
     )
     tags = models.ManyToManyField(FavouriteTag, blank=True)
+    valid_url = models.ForeignKey(
+        ValidUrl,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="favourite_urls",
+    )
+    # Maintained by signals from the title, url, category and tag names
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_url = instance.__dict__.get("url")
+        instance._loaded_category_id = instance.__dict__.get("category_id")
+        return instance
+
+    def sync_valid_url(self):
+        if self.valid_url_id is not None:
+            if FavouriteUrl.valid_url.field.is_cached(self):
+                if self.valid_url is not None and self.valid_url.url == self.url:
+                    return
+            elif self.url == getattr(self, "_loaded_url", None):
+                return
+        valid_url = valid_url_cache.get_valid_url(self.url)
+        self.valid_url_id = valid_url.id if valid_url is not None else None
+
+    def check_category_owner(self):
+        # A category unchanged since the row was loaded has been checked before
+        if self.category_id is None or self.category_id == getattr(
+            self, "_loaded_category_id", None
+        ):
+            return
+        if FavouriteUrl.category.field.is_cached(self):
+            if self.category.user_id != self.user_id:
+                raise ValidationError(CATEGORY_OWNER_ERROR)
+        else:
+            check_owned(
+                FavouriteCategory,
+                self.user_id,
+                [self.category_id],
+                CATEGORY_OWNER_ERROR,
+            )
+
     def save(self, *args, **kwargs):
         tags_to_save = kwargs.pop("tags", None)
         category_to_save = kwargs.pop("category", None)
-        user = kwargs.pop("user", self.user)
+        user_id = getattr(kwargs.pop("user", None), "pk", self.user_id)
 
         if tags_to_save:
-            for tag in tags_to_save:
-                if not user.tags.exists() or (
-                    user.tags.exists() and tag not in user.tags
-                ):
-                    raise ValidationError("Tag must belong to the same user.")
+            check_owned(FavouriteTag, user_id, tags_to_save, TAG_OWNER_ERROR)
         if category_to_save:
-            if not user.categories.exists() or (
-                user.categories.exists() and category_to_save not in user.categories
-            ):
-                raise ValidationError("Category must belong to the same user.")
+            check_owned(
+                FavouriteCategory, user_id, [category_to_save], CATEGORY_OWNER_ERROR
+            )
+        self.sync_valid_url()
         super().save(*args, **kwargs)
+        self._loaded_url = self.url
+        self._loaded_category_id = self.category_id
 
     @property
     def is_valid(self):
-        valid_url = ValidUrl.objects.filter(url=self.url)
-        if valid_url.exists():
-            return valid_url.first().is_valid
-        return False
+        if self.valid_url_id is None:
+            return False
+        return self.valid_url.is_valid
+
+    @property
+    def validation_status(self):
+        if self.valid_url_id is None:
+            return ValidationStatus.PENDING
+        return self.valid_url.validation_status
 
     class Meta:
         verbose_name = _("Favourite Url")
         verbose_name_plural = _("Favourite Urls")
         unique_together = ("user", "url")
+        # Ordering indexes (created/updated also back keyset pagination), then
+        # trigram indexes on UPPER() to match
+        # what icontains generates
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="favouriteurl_user_created_idx",
+            ),
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                name="favouriteurl_user_updated_idx",
+            ),
+            models.Index(
+                fields=["user", "title", "id"], name="favouriteurl_user_title_idx"
+            ),
+            models.Index(
+                fields=["user", "category"], name="favouriteurl_user_category_idx"
+            ),
+            models.Index(
+                fields=["user", "valid_url"], name="favouriteurl_user_validurl_idx"
+            ),
+            # Rows still waiting for a ValidUrl link or a fetched title
+            models.Index(
+                fields=["url"],
+                condition=models.Q(valid_url__isnull=True),
+                name="favouriteurl_unlinked_url_idx",
+            ),
+            models.Index(
+                fields=["valid_url"],
+                condition=models.Q(title__isnull=True) | models.Q(title=""),
+                name="favouriteurl_untitled_idx",
+            ),
+            GinIndex(fields=["search_vector"]),
+            GinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                name="favouriteurl_title_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("url"), name="gin_trgm_ops"),
+                name="favouriteurl_url_trgm",
+            ),
+        ]
+
+
+class FavouriteStats(models.Model):
+    # Only ever changed with F() updates, so stale instances never overwrite it
+    user = models.OneToOneField(
+        User, primary_key=True, on_delete=models.CASCADE, related_name="favourite_stats"
+    )
+    urls_count = models.IntegerField(default=0)
+    tags_count = models.IntegerField(default=0)
+    categories_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Favourite Stats")
+        verbose_name_plural = _("Favourite Stats")
+
+    def __str__(self):
+        return str(self.user)
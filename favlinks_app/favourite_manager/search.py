@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, Func, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest, Upper
+
+
+def get_search_vector(favourite_url_model):
+    config = settings.FAVOURITE_SEARCH_CONFIG
+    category_model = favourite_url_model._meta.get_field("category").related_model
+    tags_through = favourite_url_model.tags.through
+
+    # URLs are split on punctuation so "docs.python.org/3" yields searchable words
+    url_words = Func(
+        F("url"),
+        Value(r"[^[:alnum:]]+"),
+        Value(" "),
+        Value("g"),
+        function="regexp_replace",
+    )
+    category_name = Subquery(
+        category_model.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    tag_names = Subquery(
+        tags_through.objects.filter(favouriteurl=OuterRef("pk"))
+        .values("favouriteurl")
+        .annotate(names=StringAgg("favouritetag__name", " "))
+        .values("names")[:1]
+    )
+    return (
+        SearchVector("title", config=config, weight="A")
+        + SearchVector(category_name, tag_names, config=config, weight="B")
+        + SearchVector(url_words, config=config, weight="C")
+    )
+
+
+def update_search_vectors(queryset):
+    return queryset.update(search_vector=get_search_vector(queryset.model))
+
+
+def search_favourite_urls(queryset, text):
+    query = SearchQuery(
+        text, config=settings.FAVOURITE_SEARCH_CONFIG, search_type="websearch"
+    )
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-id")
+    )
+
+
+def filter_similar_favourite_urls(queryset, text, threshold=None):
+    if threshold is None:
+        threshold = settings.FAVOURITE_SIMILARITY_THRESHOLD
+    queryset = queryset.annotate(
+        similarity=Greatest(
+            TrigramWordSimilarity(text, "title"),
+            TrigramWordSimilarity(text, "url"),
+        )
+    )
+    if threshold is None:
+        # %> compares against the database's pg_trgm.word_similarity_threshold,
+        # which keeps the lookup on the trigram indexes. It is never changed
+        # from here: a session setting would outlive the request on persistent
+        # and pooled connections
+        queryset = queryset.annotate(
+            upper_title=Upper("title"), upper_url=Upper("url")
+        ).filter(
+            Q(upper_title__trigram_word_similar=text)
+            | Q(upper_url__trigram_word_similar=text)
+        )
+    else:
+        # Compared row by row, within the user's favourites only
+        queryset = queryset.filter(similarity__gte=threshold)
+    return queryset.order_by("-similarity", "-id")
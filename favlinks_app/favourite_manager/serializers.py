@@ -1,17 +1,30 @@
+from django.core.validators import URLValidator
+from django.db import transaction
 from rest_framework import serializers
 from favourite_manager.models import (
     FavouriteUrl,
     FavouriteCategory,
     FavouriteTag,
     ValidUrl,
+    get_owned_ids,
 )
+from favourite_manager.search import update_search_vectors
 
 
 class ValidUrlSerializer(serializers.ModelSerializer):
     class Meta:
         model = ValidUrl
-        fields = ["url", "title", "is_valid", "updated_at"]
-        read_only_fields = ["title", "is_valid", "updated_at"]
+        fields = ["url", "title", "is_valid", "validation_status", "updated_at"]
+        read_only_fields = ["title", "is_valid", "validation_status", "updated_at"]
+
+
+class ValidUrlValidateSerializer(serializers.Serializer):
+    # Checked before anything is stored or fetched, the endpoint is public
+    url = serializers.URLField(
+        max_length=ValidUrl._meta.get_field("url").max_length,
+        validators=[URLValidator(schemes=["http", "https"])],
+    )
+    sync = serializers.BooleanField(default=False)
 
 
 class FavouriteCategorySerializer(serializers.ModelSerializer):
@@ -85,10 +98,18 @@ class FavouriteUrlSerializer(serializers.ModelSerializer):
             "tags",
             "category",
             "is_valid",
+            "validation_status",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = [
+            "id",
+            "user",
             "created_at",
             "updated_at",
+            "is_valid",
+            "validation_status",
         ]
-        read_only_fields = ["id", "user", "created_at", "updated_at", "is_valid"]
 
     def create(self, validated_data):
         return FavouriteUrl.objects.create(**validated_data)
@@ -99,11 +120,22 @@ class FavouriteUrlSerializer(serializers.ModelSerializer):
         return instance
 
 
+class OwnedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Only checks the pk, the serializer looks them all up for the user at once
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
 class FavouriteUrlCreateUpdateSerializer(serializers.ModelSerializer):
-    category = serializers.PrimaryKeyRelatedField(
+    category = OwnedPrimaryKeyRelatedField(
         queryset=FavouriteCategory.objects.all(), required=False
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = OwnedPrimaryKeyRelatedField(
         queryset=FavouriteTag.objects.all(), many=True, required=False
     )
     title = serializers.CharField(required=False)
@@ -117,55 +149,90 @@ class FavouriteUrlCreateUpdateSerializer(serializers.ModelSerializer):
             "title",
             "tags",
             "category",
+            "validation_status",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = [
+            "id",
+            "user",
+            "validation_status",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["id", "user", "created_at", "updated_at"]
 
-    def create(self, validated_data):
+    def validate(self, attrs):
         user = self.context["user"]
-        category = validated_data.pop("category", None)
-        tags = validated_data.pop("tags", None)
-        favourite_url = FavouriteUrl.objects.create(**validated_data)
-        if category:
+        # Categories and tags of other users are left out, not rejected
+        if "category" in attrs:
             category = FavouriteCategory.objects.filter(
-                id=category.id, user=user
+                user=user, pk=attrs.pop("category")
             ).first()
-            if category:
-                favourite_url.category = category
-                favourite_url.save()
-
-        if tags:
-            tag_ids = [tag.id for tag in tags]
-            tags_queryset = FavouriteTag.objects.filter(id__in=tag_ids, user=user)
-            favourite_url.tags.set(tags_queryset)
-
+            if category is not None:
+                attrs["category"] = category
+        if "tags" in attrs:
+            attrs["tags"] = get_owned_ids(FavouriteTag, user.id, attrs["tags"])
+        return attrs
+
+    def set_tags(self, favourite_url, tag_ids, current_ids=frozenset()):
+        # Written to the through table directly; the row is saved in the same
+        # transaction, which invalidates the owner's response cache
+        through = FavouriteUrl.tags.through
+        removed_ids = current_ids - tag_ids
+        added_ids = tag_ids - current_ids
+        if removed_ids:
+            through.objects.filter(
+                favouriteurl_id=favourite_url.pk, favouritetag_id__in=removed_ids
+            ).delete()
+        if added_ids:
+            through.objects.bulk_create(
+                through(favouriteurl_id=favourite_url.pk, favouritetag_id=tag_id)
+                for tag_id in added_ids
+            )
+        return bool(removed_ids or added_ids)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        tag_ids = validated_data.pop("tags", set())
+        favourite_url = FavouriteUrl.objects.create(**validated_data)
+        if self.set_tags(favourite_url, tag_ids):
+            update_search_vectors(FavouriteUrl.objects.filter(pk=favourite_url.pk))
         return favourite_url
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        user = self.context["user"]
-        tags = validated_data.get("tags", None)
-        category = validated_data.get("category", None)
-
-        if category is None:
+        if "category" in validated_data:
+            instance.category = validated_data["category"]
+        elif self.initial_data.get("category") is None:
             instance.category = None
-        else:
-            category = FavouriteCategory.objects.filter(
-                id=category.id, user=user
-            ).first()
-            if category:
-                instance.category = category
-                instance.save()
-
-        if tags is None:
-            instance.tags.clear()
-        else:
-            tag_ids = [tag.id for tag in tags]
-            tags_queryset = FavouriteTag.objects.filter(id__in=tag_ids, user=user)
-            instance.tags.set(tags_queryset)
 
+        # Tags go first so that saving the row indexes their names for search
+        current_ids = set(
+            FavouriteUrl.tags.through.objects.filter(
+                favouriteurl_id=instance.pk
+            ).values_list("favouritetag_id", flat=True)
+        )
+        self.set_tags(instance, validated_data.get("tags", set()), current_ids)
         instance.url = validated_data.get("url", instance.url)
         instance.title = validated_data.get("title", instance.title)
+        if validated_data.get("valid_url_id"):
+            instance.valid_url_id = validated_data["valid_url_id"]
         instance.save()
 
         return instance
+
+
+class FavouriteUrlBulkItemSerializer(serializers.Serializer):
+    url = serializers.URLField(max_length=200)
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    category = serializers.IntegerField(required=False, allow_null=True)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class FavouriteUrlBulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class BookmarkImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=["html", "json"], required=False)
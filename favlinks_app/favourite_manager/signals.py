@@ -1,20 +1,173 @@
-from django.core.exceptions import ValidationError
-from django.db.models.signals import m2m_changed, pre_save
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db.models import QuerySet
 from django.dispatch import receiver
-from .models import FavouriteUrl
+from user_manager.models import User
+from . import valid_url_cache
+from .cache import invalidate_user_cache, invalidate_valid_url_users
+from .counters import adjust_counts
+from .models import (
+    TAG_OWNER_ERROR,
+    FavouriteCategory,
+    FavouriteStats,
+    FavouriteTag,
+    FavouriteUrl,
+    ValidUrl,
+    check_owned,
+)
+from .search import update_search_vectors
 
 
 @receiver(m2m_changed, sender=FavouriteUrl.tags.through)
 def check_tags_belong_to_user(
     sender, instance, action, reverse, model, pk_set, **kwargs
 ):
-    if action == "pre_add" and not reverse:
-        user = instance.user
-        if not model.objects.filter(pk__in=pk_set, user=user).exists():
-            raise ValidationError("Tag must belong to the same user.")
+    # pk_set holds tags when adding to a favourite, favourites when adding to a tag
+    if action == "pre_add":
+        check_owned(model, instance.user_id, pk_set, TAG_OWNER_ERROR)
 
 
 @receiver(pre_save, sender=FavouriteUrl)
 def check_category_user(sender, instance, **kwargs):
-    if instance.category and instance.user != instance.category.user:
-        raise ValidationError("Category must belong to the same user.")
+    instance.check_category_owner()
+
+
+@receiver(post_save, sender=ValidUrl)
+def write_through_valid_url_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: valid_url_cache.store_valid_url(instance))
+
+
+@receiver(post_delete, sender=ValidUrl)
+def forget_valid_url_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: valid_url_cache.forget_valid_url(instance.url))
+
+
+@receiver(post_save, sender=ValidUrl)
+def link_favourite_urls(sender, instance, created, **kwargs):
+    if created:
+        FavouriteUrl.objects.filter(url=instance.url, valid_url__isnull=True).update(
+            valid_url=instance
+        )
+
+
+def update_favourite_url_search_vectors(favourite_url_ids):
+    if favourite_url_ids:
+        update_search_vectors(FavouriteUrl.objects.filter(pk__in=favourite_url_ids))
+
+
+@receiver(post_save, sender=FavouriteUrl)
+def update_search_vector_on_save(sender, instance, **kwargs):
+    update_favourite_url_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=FavouriteUrl.tags.through)
+def update_search_vector_on_tags_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            update_favourite_url_search_vectors([instance.pk])
+    elif action == "pre_clear":
+        instance._tagged_favourite_url_ids = list(
+            instance.favouriteurl_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        update_favourite_url_search_vectors(instance._tagged_favourite_url_ids)
+    elif action in ("post_add", "post_remove"):
+        update_favourite_url_search_vectors(pk_set)
+
+
+def is_renamed(instance, created):
+    # Saves that leave the loaded name alone do not touch the linked favourites
+    renamed = not created and instance.name != getattr(instance, "_loaded_name", None)
+    instance._loaded_name = instance.name
+    return renamed
+
+
+@receiver(post_save, sender=FavouriteTag)
+def update_search_vector_on_tag_rename(sender, instance, created, **kwargs):
+    if is_renamed(instance, created):
+        update_search_vectors(FavouriteUrl.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=FavouriteCategory)
+def update_search_vector_on_category_rename(sender, instance, created, **kwargs):
+    if is_renamed(instance, created):
+        update_search_vectors(FavouriteUrl.objects.filter(category=instance))
+
+
+@receiver(pre_delete, sender=FavouriteTag)
+@receiver(pre_delete, sender=FavouriteCategory)
+def collect_search_vectors_to_update(sender, instance, **kwargs):
+    # The tag links and category references go away without signals of their own
+    if sender is FavouriteTag:
+        favourite_urls = FavouriteUrl.objects.filter(tags=instance)
+    else:
+        favourite_urls = FavouriteUrl.objects.filter(category=instance)
+    instance._search_favourite_url_ids = list(
+        favourite_urls.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=FavouriteTag)
+@receiver(post_delete, sender=FavouriteCategory)
+def update_search_vectors_on_delete(sender, instance, **kwargs):
+    update_favourite_url_search_vectors(instance._search_favourite_url_ids)
+
+
+@receiver(post_save, sender=FavouriteUrl)
+@receiver(post_delete, sender=FavouriteUrl)
+@receiver(post_save, sender=FavouriteCategory)
+@receiver(post_delete, sender=FavouriteCategory)
+@receiver(post_save, sender=FavouriteTag)
+@receiver(post_delete, sender=FavouriteTag)
+def invalidate_owner_response_cache(sender, instance, **kwargs):
+    invalidate_user_cache(instance.user_id)
+
+
+@receiver(m2m_changed, sender=FavouriteUrl.tags.through)
+def invalidate_response_cache_on_tags_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_user_cache(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def create_favourite_stats(sender, instance, created, **kwargs):
+    if created:
+        FavouriteStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=FavouriteUrl)
+@receiver(post_save, sender=FavouriteCategory)
+@receiver(post_save, sender=FavouriteTag)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counts(sender, instance.user_id, 1)
+
+
+@receiver(post_delete, sender=FavouriteUrl)
+@receiver(post_delete, sender=FavouriteCategory)
+@receiver(post_delete, sender=FavouriteTag)
+def count_deleted(sender, instance, origin=None, **kwargs):
+    # Rows deleted along with their user take the stats row with them
+    if isinstance(origin, User) or (
+        isinstance(origin, QuerySet) and origin.model is User
+    ):
+        return
+    adjust_counts(sender, instance.user_id, -1)
+
+
+@receiver(post_save, sender=ValidUrl)
+def invalidate_response_cache_on_validation(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    # Schedule-only saves do not change anything a response shows
+    if created or (update_fields and set(update_fields) <= set(ValidUrl.check_fields)):
+        return
+    invalidate_valid_url_users([instance.id])
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from config.helpers import BaseTestCase
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.reverse import reverse
+from unittest.mock import patch
+
+from favourite_manager import bulk
+from favourite_manager.bulk import bulk_delete_favourite_urls, bulk_save_favourite_urls
+from favourite_manager.counters import get_user_stats
+from favourite_manager.models import FavouriteStats, FavouriteUrl, ValidUrl
+
+
+class FavouriteStatsTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.given_a_new_user()
+
+    def get_stats(self):
+        return FavouriteStats.objects.get(user=self.user)
+
+    def test_counts_follow_creates_and_deletes(self):
+        tag = self.given_a_favourite_tag(user=self.user)
+        category = self.given_a_favourite_category(user=self.user)
+        favourite_url = self.given_a_favourite_url(self.user, tags=[tag])
+        self.given_a_favourite_url(self.user, url="fav.com", category=category)
+        stats = self.get_stats()
+        self.assertEqual(
+            (stats.urls_count, stats.tags_count, stats.categories_count), (2, 1, 1)
+        )
+
+        favourite_url.delete()
+        tag.delete()
+        category.delete()
+        stats = self.get_stats()
+        self.assertEqual(
+            (stats.urls_count, stats.tags_count, stats.categories_count), (1, 0, 0)
+        )
+
+    def test_bulk_writes_update_urls_count_once(self):
+        ValidUrl.objects.create(url="https://a.com", is_valid=True)
+        ValidUrl.objects.create(url="https://b.com", is_valid=True)
+        results = bulk_save_favourite_urls(
+            self.user, [{"url": "https://a.com"}, {"url": "https://b.com"}]
+        )
+        self.assertEqual(self.get_stats().urls_count, 2)
+
+        # Ids, rows, tag links, rows again, then a single counter update, all
+        # inside one savepoint
+        with patch("favourite_manager.cache.bump_user_generation") as mock_bump:
+            with self.assertNumQueries(7), self.captureOnCommitCallbacks(execute=True):
+                bulk_delete_favourite_urls(
+                    self.user, [result["id"] for result in results]
+                )
+        self.assertEqual(self.get_stats().urls_count, 0)
+        mock_bump.assert_called_once_with(self.user.id)
+
+    def test_user_delete_cascades_stats(self):
+        self.given_a_favourite_url(self.user)
+        self.user.delete()
+        self.assertFalse(FavouriteStats.objects.exists())
+
+    def test_missing_stats_are_recounted(self):
+        self.given_a_favourite_url(self.user)
+        FavouriteStats.objects.filter(user=self.user).delete()
+        self.user.refresh_from_db()
+        self.assertEqual(get_user_stats(self.user).urls_count, 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        self.given_a_favourite_url(self.user)
+        FavouriteStats.objects.filter(user=self.user).update(urls_count=5)
+        out = StringIO()
+        call_command("reconcile_favourite_stats", stdout=out)
+        self.assertIn("1 user(s)", out.getvalue())
+        self.assertEqual(self.get_stats().urls_count, 1)
+
+    @override_settings(FAVOURITE_URLS_PER_USER_LIMIT=1)
+    def test_create_bad_request_given_quota_reached(self):
+        self.given_a_favourite_url(self.user)
+        ValidUrl.objects.create(url="https://facebook.com", is_valid=True)
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        response = self.when_user_posts_and_gets_json(
+            data={"url": "https://facebook.com"}
+        )
+        self.assertResponseBadRequest()
+        self.assertEqual(response["error"], "Favourite URL limit reached")
+        self.assertEqual(FavouriteUrl.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(FAVOURITE_URLS_PER_USER_LIMIT=1)
+    def test_bulk_rejects_items_over_quota(self):
+        ValidUrl.objects.create(url="https://a.com", is_valid=True)
+        ValidUrl.objects.create(url="https://b.com", is_valid=True)
+        results = bulk_save_favourite_urls(
+            self.user, [{"url": "https://a.com"}, {"url": "https://b.com"}]
+        )
+        self.assertEqual([result["status"] for result in results], ["created", "error"])
+        self.assertEqual(self.get_stats().urls_count, 1)
+
+    def test_bulk_reports_rows_saved_concurrently(self):
+        ValidUrl.objects.create(url="https://a.com", is_valid=True)
+        ValidUrl.objects.create(url="https://b.com", is_valid=True)
+        resolve_valid_urls = bulk.resolve_valid_urls
+
+        def save_concurrently(urls):
+            # Another request saves the same URL after this one looked for it
+            FavouriteUrl.objects.create(user=self.user, url="https://b.com")
+            return resolve_valid_urls(urls)
+
+        with patch.object(bulk, "resolve_valid_urls", side_effect=save_concurrently):
+            results = bulk_save_favourite_urls(
+                self.user, [{"url": "https://a.com"}, {"url": "https://b.com"}]
+            )
+
+        self.assertEqual([result["status"] for result in results], ["created", "error"])
+        self.assertEqual(
+            results[1]["errors"], {"url": ["Saved by another request, try again"]}
+        )
+        self.assertEqual(FavouriteUrl.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.get_stats().urls_count, 2)
+
+    def test_bulk_delete_rolls_back_given_counter_write_fails(self):
+        favourite_url = self.given_a_favourite_url(self.user)
+        with patch(
+            "favourite_manager.counters.write_counts", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            bulk_delete_favourite_urls(self.user, [favourite_url.id])
+        self.assertTrue(FavouriteUrl.objects.filter(id=favourite_url.id).exists())
+        self.assertEqual(self.get_stats().urls_count, 1)
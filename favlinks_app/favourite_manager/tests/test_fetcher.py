@@ -0,0 +1,280 @@
+import threading
+from config.helpers import BaseTestCase
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from favourite_manager.celery import (
+    clean_up_invalid_validurl_instances,
+    summarize_url_validation,
+    validate_url_chunk,
+    validate_urls_and_update_titles,
+)
+from favourite_manager.fetcher import UrlFetchEngine
+from favourite_manager.models import ValidationStatus, ValidUrl
+
+
+class UrlFetchEngineTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.valid_url = ValidUrl.objects.create(
+            url="https://valid.com", title="old title", is_valid=True
+        )
+        self.broken_url = ValidUrl.objects.create(
+            url="https://broken.com", title="broken", is_valid=True
+        )
+        self.missing_url = ValidUrl.objects.create(url="https://missing.com")
+
+    def fake_get(self, url, **kwargs):
+        if url == self.broken_url.url:
+            raise requests.ConnectionError()
+        response = MagicMock()
+        response.status_code = 404 if url == self.missing_url.url else 200
+        response.headers = {"ETag": '"v2"'}
+        return response
+
+    @patch("favourite_manager.models.BeautifulSoup")
+    @patch("favourite_manager.http_client.get")
+    def test_run_updates_all_urls_in_batches(self, mock_requests_get, mock_bs):
+        mock_requests_get.side_effect = self.fake_get
+        mock_bs.return_value.title.string = "new title"
+
+        stats = UrlFetchEngine(
+            concurrency=2, per_host_concurrency=1, batch_size=2
+        ).run()
+
+        self.assertEqual(stats, {"checked": 3, "changed": 2, "failed": 2})
+        self.valid_url.refresh_from_db()
+        self.broken_url.refresh_from_db()
+        self.missing_url.refresh_from_db()
+        self.assertEqual(self.valid_url.title, "new title")
+        self.assertEqual(self.valid_url.validation_status, ValidationStatus.VALID)
+        self.assertEqual(self.broken_url.validation_status, ValidationStatus.INVALID)
+        self.assertEqual(self.missing_url.validation_status, ValidationStatus.INVALID)
+        self.assertEqual(self.valid_url.etag, '"v2"')
+
+    @patch("favourite_manager.http_client.get")
+    def test_run_passes_request_timeout(self, mock_requests_get):
+        mock_requests_get.return_value.status_code = 404
+
+        UrlFetchEngine(timeout=3).run(ValidUrl.objects.filter(id=self.valid_url.id))
+
+        mock_requests_get.assert_called_once_with(
+            self.valid_url.url, timeout=3, headers={}, stream=True
+        )
+
+    @patch("favourite_manager.models.BeautifulSoup")
+    @patch("favourite_manager.http_client.get")
+    def test_not_modified_keeps_title_without_parsing(self, mock_requests_get, mock_bs):
+        ValidUrl.objects.filter(id=self.valid_url.id).update(
+            etag='"v1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT"
+        )
+        mock_requests_get.return_value.status_code = 304
+
+        stats = UrlFetchEngine().run(ValidUrl.objects.filter(id=self.valid_url.id))
+
+        mock_requests_get.assert_called_once_with(
+            self.valid_url.url,
+            timeout=None,
+            headers={
+                "If-None-Match": '"v1"',
+                "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+            },
+            stream=True,
+        )
+        mock_bs.assert_not_called()
+        self.assertEqual(stats, {"checked": 1, "changed": 0, "failed": 0})
+        self.valid_url.refresh_from_db()
+        self.assertEqual(self.valid_url.title, "old title")
+        self.assertEqual(self.valid_url.validation_status, ValidationStatus.VALID)
+
+    @patch("favourite_manager.http_client.get")
+    def test_invalid_url_is_not_revalidated_conditionally(self, mock_requests_get):
+        ValidUrl.objects.filter(id=self.missing_url.id).update(etag='"v1"')
+        mock_requests_get.return_value.status_code = 404
+
+        UrlFetchEngine().run(ValidUrl.objects.filter(id=self.missing_url.id))
+
+        mock_requests_get.assert_called_once_with(
+            self.missing_url.url, timeout=None, headers={}, stream=True
+        )
+
+    @patch("favourite_manager.models.BeautifulSoup")
+    @patch("favourite_manager.http_client.get")
+    def test_long_title_is_truncated_to_column(self, mock_requests_get, mock_bs):
+        mock_requests_get.side_effect = self.fake_get
+        mock_bs.return_value.title.string = "t" * 300
+
+        stats = UrlFetchEngine(batch_size=2).run(
+            ValidUrl.objects.filter(id__in=[self.valid_url.id, self.broken_url.id])
+        )
+
+        self.assertEqual(stats, {"checked": 2, "changed": 2, "failed": 1})
+        self.valid_url.refresh_from_db()
+        self.assertEqual(self.valid_url.title, "t" * 255)
+
+    @patch("favourite_manager.models.BeautifulSoup")
+    @patch("favourite_manager.http_client.get")
+    def test_unexpected_error_fails_only_its_url(self, mock_requests_get, mock_bs):
+        ValidUrl.objects.filter(id=self.missing_url.id).update(url="https://odd.com")
+        mock_bs.return_value.title.string = "new title"
+
+        def fake_get(url, **kwargs):
+            if url == "https://odd.com":
+                raise UnicodeDecodeError("utf-8", b"", 0, 1, "bad")
+            return self.fake_get(url, **kwargs)
+
+        mock_requests_get.side_effect = fake_get
+        with self.assertLogs("favourite_manager.fetcher", "ERROR"):
+            stats = UrlFetchEngine(batch_size=10).run()
+
+        self.assertEqual(stats, {"checked": 3, "changed": 2, "failed": 2})
+        self.valid_url.refresh_from_db()
+        self.assertEqual(self.valid_url.title, "new title")
+        odd_url = ValidUrl.objects.get(url="https://odd.com")
+        self.assertEqual(odd_url.validation_status, ValidationStatus.INVALID)
+        self.assertEqual(odd_url.consecutive_failures, 1)
+        self.assertGreater(odd_url.next_check_at, odd_url.checked_at)
+
+    @patch("favourite_manager.http_client.get")
+    def test_busy_host_does_not_hold_up_other_hosts(self, mock_requests_get):
+        slow_urls = [
+            ValidUrl.objects.create(url=f"https://slow.com/{i}") for i in range(3)
+        ]
+        # Read after the slow host's URLs, with both workers free for them
+        other_url = ValidUrl.objects.create(url="https://other.com")
+        other_host_fetched = threading.Event()
+        waited = []
+
+        def fake_get(url, **kwargs):
+            if url == slow_urls[0].url:
+                waited.append(other_host_fetched.wait(timeout=5))
+            elif url == other_url.url:
+                other_host_fetched.set()
+            response = MagicMock()
+            response.status_code = 404
+            return response
+
+        mock_requests_get.side_effect = fake_get
+        stats = UrlFetchEngine(concurrency=2, per_host_concurrency=1).run(
+            ValidUrl.objects.filter(
+                id__in=[valid_url.id for valid_url in slow_urls + [other_url]]
+            ).order_by("id")
+        )
+
+        self.assertEqual(stats["checked"], 4)
+        self.assertEqual(waited, [True])
+
+
+class UrlValidationFanOutTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.valid_urls = [
+            ValidUrl.objects.create(url=f"https://site{i}.com") for i in range(5)
+        ]
+        self.ids = [valid_url.id for valid_url in self.valid_urls]
+
+    @patch("favourite_manager.celery.chord")
+    def test_periodic_task_dispatches_due_urls_in_chunks(self, mock_chord):
+        ValidUrl.objects.filter(id=self.ids[0]).update(
+            next_check_at=timezone.now() + timedelta(days=1)
+        )
+        with self.settings(URL_VALIDATION_CHUNK_SIZE=2):
+            chunk_count = validate_urls_and_update_titles()
+
+        self.assertEqual(chunk_count, 2)
+        chunks = mock_chord.call_args[0][0]
+        self.assertEqual(
+            sorted(sum([chunk.args[0] for chunk in chunks], [])), self.ids[1:]
+        )
+        mock_chord.return_value.assert_called_once()
+
+    @patch("favourite_manager.celery.chord")
+    def test_periodic_task_leases_dispatched_urls(self, mock_chord):
+        validate_urls_and_update_titles()
+        mock_chord.reset_mock()
+
+        self.assertEqual(validate_urls_and_update_titles(), 0)
+        mock_chord.assert_not_called()
+
+    @patch("favourite_manager.celery.chord")
+    def test_periodic_task_skips_rows_locked_by_another_run(self, mock_chord):
+        with CaptureQueriesContext(connection) as queries:
+            validate_urls_and_update_titles()
+
+        claims = [q["sql"] for q in queries if "FOR UPDATE" in q["sql"]]
+        self.assertTrue(claims)
+        for claim in claims:
+            self.assertIn("SKIP LOCKED", claim)
+
+    @patch("favourite_manager.celery.chord")
+    def test_periodic_task_claims_bounded_chunks_up_to_cap(self, mock_chord):
+        with self.settings(URL_VALIDATION_CHUNK_SIZE=2, URL_VALIDATION_MAX_PER_RUN=3):
+            with CaptureQueriesContext(connection) as queries:
+                chunk_count = validate_urls_and_update_titles()
+
+        self.assertEqual(chunk_count, 2)
+        chunks = mock_chord.call_args[0][0]
+        self.assertEqual([len(chunk.args[0]) for chunk in chunks], [2, 1])
+        self.assertEqual(
+            ValidUrl.objects.filter(next_check_at__lte=timezone.now()).count(), 2
+        )
+        claims = [q["sql"] for q in queries if "FOR UPDATE" in q["sql"]]
+        self.assertEqual(len(claims), 2)
+        for claim in claims:
+            self.assertRegex(claim, r"LIMIT [12]\b")
+
+    @patch("favourite_manager.http_client.get")
+    def test_validate_url_chunk_only_checks_its_ids(self, mock_requests_get):
+        mock_requests_get.return_value.status_code = 404
+
+        stats = validate_url_chunk(self.ids[1:3])
+
+        self.assertEqual(stats["checked"], 2)
+        self.assertEqual(stats["failed"], 2)
+        self.assertIn("duration", stats)
+        self.assertEqual(ValidUrl.objects.filter(checked_at__isnull=False).count(), 2)
+
+    def test_summarize_url_validation_aggregates_chunk_stats(self):
+        summary = summarize_url_validation(
+            [
+                {"checked": 3, "changed": 1, "failed": 0, "duration": 1.5},
+                {"checked": 2, "changed": 0, "failed": 2, "duration": 0.5},
+            ]
+        )
+        self.assertEqual(
+            summary,
+            {
+                "chunks": 2,
+                "checked": 5,
+                "changed": 1,
+                "failed": 2,
+                "worker_duration": 2.0,
+            },
+        )
+
+
+class CleanUpInvalidValidUrlTestCase(BaseTestCase):
+    def test_deletes_only_old_orphaned_invalid_urls(self):
+        user = self.given_a_new_user()
+        linked = ValidUrl.objects.create(url="https://linked.com")
+        orphan = ValidUrl.objects.create(url="https://orphan.com")
+        recent = ValidUrl.objects.create(url="https://recent.com")
+        valid = ValidUrl.objects.create(url="https://valid.com", is_valid=True)
+        favourite_url = self.given_a_favourite_url(user, url=linked.url)
+        ValidUrl.objects.exclude(id=recent.id).update(
+            updated_at=timezone.now() - timedelta(days=30)
+        )
+
+        self.assertEqual(clean_up_invalid_validurl_instances(), 1)
+        self.assertEqual(
+            set(ValidUrl.objects.values_list("id", flat=True)),
+            {linked.id, recent.id, valid.id},
+        )
+        favourite_url.refresh_from_db()
+        self.assertEqual(favourite_url.valid_url_id, linked.id)
+        self.assertFalse(ValidUrl.objects.filter(id=orphan.id).exists())
@@ -0,0 +1,40 @@
+from config.helpers import BaseTestCase
+from django.test import override_settings
+from unittest.mock import patch
+
+from favourite_manager import http_client
+
+
+class HttpClientTestCase(BaseTestCase):
+    @override_settings(
+        HTTP_CLIENT_RETRIES=7,
+        HTTP_CLIENT_BACKOFF_FACTOR=0.25,
+        HTTP_CLIENT_POOL_MAXSIZE=13,
+        HTTP_CLIENT_MAX_REDIRECTS=3,
+    )
+    def test_session_pools_connections_and_retries(self):
+        session = http_client.build_session()
+        for url in ("http://test.com", "https://test.com"):
+            adapter = session.get_adapter(url)
+            self.assertEqual(adapter.max_retries.total, 7)
+            self.assertEqual(adapter.max_retries.backoff_factor, 0.25)
+            self.assertEqual(adapter.poolmanager.connection_pool_kw["maxsize"], 13)
+        self.assertEqual(session.max_redirects, 3)
+
+    def test_session_is_shared(self):
+        self.assertIs(http_client.get_session(), http_client.get_session())
+
+    @override_settings(HTTP_CLIENT_CONNECT_TIMEOUT=2, HTTP_CLIENT_READ_TIMEOUT=9)
+    @patch("favourite_manager.http_client.get_session")
+    def test_get_uses_default_connect_and_read_timeouts(self, mock_get_session):
+        http_client.get("https://test.com", stream=True)
+        mock_get_session.return_value.get.assert_called_once_with(
+            "https://test.com", timeout=(2, 9), stream=True
+        )
+
+    @patch("favourite_manager.http_client.get_session")
+    def test_get_keeps_explicit_timeout(self, mock_get_session):
+        http_client.get("https://test.com", timeout=3)
+        mock_get_session.return_value.get.assert_called_once_with(
+            "https://test.com", timeout=3
+        )
@@ -0,0 +1,279 @@
+import io
+import json
+from config.helpers import BaseTestCase
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.utils import timezone
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from favourite_manager import importer
+from favourite_manager.celery import clean_up_import_placeholders, import_bookmarks_file
+from favourite_manager.importer import (
+    BookmarkImporter,
+    PendingFolder,
+    parse_bookmarks_json,
+    parse_netscape_html,
+)
+from favourite_manager.models import (
+    FavouriteCategory,
+    FavouriteStats,
+    FavouriteTag,
+    FavouriteUrl,
+)
+
+NETSCAPE_HTML = b"""<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><A HREF="https://top.com/" ADD_DATE="1">Top &amp; level</A>
+    <DT><H3 ADD_DATE="1">Dev</H3>
+    <DL><p>
+        <DT><A HREF="https://docs.python.org/" TAGS="python, docs">Python docs</A>
+        <DT><H3>Empty</H3>
+        <DL><p>
+        </DL><p>
+        <DT><A HREF="https://djangoproject.com/">Django</A>
+    </DL><p>
+    <DT><A HREF="https://bottom.com/">Bottom</A>
+</DL><p>
+"""
+
+
+CHROME_JSON = {
+    "roots": {
+        "bookmark_bar": {
+            "children": [
+                {"name": "Python", "type": "url", "url": "https://python.org/"},
+                {
+                    "children": [
+                        {"name": "Deep", "type": "url", "url": "https://deep.com/"}
+                    ],
+                    "name": "Nested",
+                    "type": "folder",
+                },
+                {"name": "Docs", "type": "url", "url": "https://docs.python.org/"},
+            ],
+            "name": "Bookmarks bar",
+            "type": "folder",
+        }
+    },
+    "version": 1,
+}
+
+
+def get_folder_name(folder):
+    return folder.name if isinstance(folder, PendingFolder) else folder
+
+
+class BookmarkParserTestCase(BaseTestCase):
+    def test_parse_netscape_html_folders_and_tags(self):
+        with patch.object(importer, "READ_CHUNK_SIZE", 7):
+            entries = list(parse_netscape_html(io.BytesIO(NETSCAPE_HTML)))
+        self.assertEqual(
+            entries,
+            [
+                {
+                    "url": "https://top.com/",
+                    "title": "Top & level",
+                    "folder": None,
+                    "tags": [],
+                },
+                {
+                    "url": "https://docs.python.org/",
+                    "title": "Python docs",
+                    "folder": "Dev",
+                    "tags": ["python", "docs"],
+                },
+                {
+                    "url": "https://djangoproject.com/",
+                    "title": "Django",
+                    "folder": "Dev",
+                    "tags": [],
+                },
+                {
+                    "url": "https://bottom.com/",
+                    "title": "Bottom",
+                    "folder": None,
+                    "tags": [],
+                },
+            ],
+        )
+
+    def test_parse_chrome_json_names_folders_after_children(self):
+        entries = list(
+            parse_bookmarks_json(io.BytesIO(json.dumps(CHROME_JSON).encode()))
+        )
+        self.assertEqual(
+            [
+                (entry["url"], entry["title"], get_folder_name(entry["folder"]))
+                for entry in entries
+            ],
+            [
+                ("https://python.org/", "Python", "Bookmarks bar"),
+                ("https://deep.com/", "Deep", "Nested"),
+                ("https://docs.python.org/", "Docs", "Bookmarks bar"),
+            ],
+        )
+
+    def test_parse_chrome_json_streams_children_before_folder_name(self):
+        entries = parse_bookmarks_json(io.BytesIO(json.dumps(CHROME_JSON).encode()))
+        folder = next(entries)["folder"]
+        self.assertIsInstance(folder, PendingFolder)
+        self.assertFalse(folder.closed)
+        list(entries)
+        self.assertTrue(folder.closed)
+        self.assertEqual(folder.name, "Bookmarks bar")
+
+    def test_parse_chrome_json_skips_nested_objects_with_urls(self):
+        data = {
+            "roots": {
+                "other": {
+                    "children": [
+                        {
+                            "meta_info": {"url": "https://meta.com/"},
+                            "name": "Real",
+                            "type": "url",
+                            "url": "https://real.com/",
+                        }
+                    ],
+                    "name": "Other",
+                    "type": "folder",
+                    "sync_transaction": {"url": "https://sync.com/"},
+                }
+            }
+        }
+        entries = list(parse_bookmarks_json(io.BytesIO(json.dumps(data).encode())))
+        self.assertEqual([entry["url"] for entry in entries], ["https://real.com/"])
+
+    def test_parse_firefox_json_with_tags(self):
+        data = {
+            "title": "",
+            "children": [
+                {
+                    "title": "Menu",
+                    "children": [
+                        {
+                            "title": "MDN",
+                            "uri": "https://developer.mozilla.org/",
+                            "tags": "web,docs",
+                        }
+                    ],
+                }
+            ],
+        }
+        entries = list(parse_bookmarks_json(io.BytesIO(json.dumps(data).encode())))
+        self.assertEqual(
+            entries,
+            [
+                {
+                    "url": "https://developer.mozilla.org/",
+                    "title": "MDN",
+                    "folder": "Menu",
+                    "tags": ["web", "docs"],
+                }
+            ],
+        )
+
+
+@patch("favourite_manager.bulk.validate_urls_and_update_favourite_titles.delay")
+class BookmarkImporterTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.given_a_new_user()
+
+    def test_import_creates_categories_tags_and_favourites_in_batches(self, mock_delay):
+        entries = parse_netscape_html(io.BytesIO(NETSCAPE_HTML))
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = BookmarkImporter(self.user, batch_size=2).run(entries)
+
+        self.assertEqual(stats, {"created": 4, "updated": 0, "failed": 0})
+        self.assertEqual(mock_delay.call_count, 2)
+        self.assertEqual(
+            list(FavouriteCategory.objects.values_list("name", flat=True)), ["Dev"]
+        )
+        self.assertCountEqual(
+            FavouriteTag.objects.values_list("name", flat=True), ["python", "docs"]
+        )
+        python_docs = FavouriteUrl.objects.get(url="https://docs.python.org/")
+        self.assertEqual(python_docs.category.name, "Dev")
+        self.assertEqual(python_docs.tags.count(), 2)
+
+    def test_import_again_updates_and_reports_invalid_urls(self, mock_delay):
+        entries = [
+            {"url": "https://top.com/", "title": "Top", "folder": None, "tags": []},
+            {"url": "javascript:void(0)", "title": "", "folder": None, "tags": []},
+        ]
+        BookmarkImporter(self.user).run(entries)
+        stats = BookmarkImporter(self.user).run(entries)
+        self.assertEqual(stats, {"created": 0, "updated": 1, "failed": 1})
+
+    def test_import_chrome_json_names_folders_after_children(self, mock_delay):
+        FavouriteCategory.objects.create(user=self.user, name="Nested")
+        entries = parse_bookmarks_json(io.BytesIO(json.dumps(CHROME_JSON).encode()))
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = BookmarkImporter(self.user, batch_size=1).run(entries)
+
+        self.assertEqual(stats, {"created": 3, "updated": 0, "failed": 0})
+        self.assertCountEqual(
+            FavouriteCategory.objects.values_list("name", flat=True),
+            ["Bookmarks bar", "Nested"],
+        )
+        self.assertCountEqual(
+            FavouriteUrl.objects.values_list("url", "category__name"),
+            [
+                ("https://python.org/", "Bookmarks bar"),
+                ("https://deep.com/", "Nested"),
+                ("https://docs.python.org/", "Bookmarks bar"),
+            ],
+        )
+        self.assertEqual(
+            list(
+                FavouriteUrl.objects.filter(search_vector="nested").values_list(
+                    "url", flat=True
+                )
+            ),
+            ["https://deep.com/"],
+        )
+        self.assertEqual(FavouriteStats.objects.get(user=self.user).categories_count, 2)
+
+    def test_import_drops_placeholder_given_unnamed_folder(self, mock_delay):
+        data = {"children": [{"uri": "https://unnamed.com/"}]}
+        entries = parse_bookmarks_json(io.BytesIO(json.dumps(data).encode()))
+        BookmarkImporter(self.user).run(entries)
+
+        self.assertFalse(FavouriteCategory.objects.exists())
+        self.assertIsNone(FavouriteUrl.objects.get().category)
+
+    def test_import_task_reads_and_removes_uploaded_file(self, mock_delay):
+        with TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            path = default_storage.save(
+                "bookmark-imports/b.html", ContentFile(NETSCAPE_HTML)
+            )
+            stats = import_bookmarks_file(self.user.id, path, "html")
+            self.assertFalse(default_storage.exists(path))
+
+        self.assertEqual(stats, {"created": 4, "updated": 0, "failed": 0})
+        self.assertEqual(FavouriteUrl.objects.filter(user=self.user).count(), 4)
+
+    def test_clean_up_removes_only_stale_placeholders(self, mock_delay):
+        stale = BookmarkImporter(self.user).create_placeholder()
+        fresh = BookmarkImporter(self.user).create_placeholder()
+        FavouriteCategory.objects.create(user=self.user, name="Importing photos")
+        favourite_url = self.given_a_favourite_url(self.user, category=stale)
+        FavouriteCategory.objects.filter(id=stale.id).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        self.assertEqual(clean_up_import_placeholders(), 1)
+        self.assertCountEqual(
+            FavouriteCategory.objects.values_list("name", flat=True),
+            [fresh.name, "Importing photos"],
+        )
+        favourite_url.refresh_from_db()
+        self.assertIsNone(favourite_url.category)
@@ -1,7 +1,17 @@
 from config.helpers import BaseTestCase
+from datetime import timedelta
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from favourite_manager.models import FavouriteUrl
+from favourite_manager.models import (
+    FavouriteCategory,
+    FavouriteTag,
+    FavouriteUrl,
+    ValidUrl,
+)
 
 
 class FavouriteCategoryTestCase(BaseTestCase):
@@ -22,6 +32,15 @@ class FavouriteCategoryTestCase(BaseTestCase):
         self.assertEqual(self.category.associated_urls_count, 2)
         self.assertEqual(self.other_category.associated_urls_count, 0)
 
+    def test_category_save_reindexes_favourites_only_on_rename(self):
+        category = FavouriteCategory.objects.get(pk=self.category.pk)
+        with self.assertNumQueries(1):
+            category.save()
+        category.name = "Travel"
+        with self.assertNumQueries(2):
+            category.save()
+        self.assertEqual(FavouriteUrl.objects.filter(search_vector="travel").count(), 2)
+
 
 class FavouritetagTestCase(BaseTestCase):
     def setUp(self):
@@ -43,6 +62,15 @@ class FavouritetagTestCase(BaseTestCase):
         self.assertEqual(self.tag_2.associated_urls_count, 1)
         self.assertEqual(self.other_tag.associated_urls_count, 0)
 
+    def test_tag_save_reindexes_favourites_only_on_rename(self):
+        tag = FavouriteTag.objects.get(pk=self.tag.pk)
+        with self.assertNumQueries(1):
+            tag.save()
+        tag.name = "Recipes"
+        with self.assertNumQueries(2):
+            tag.save()
+        self.assertEqual(FavouriteUrl.objects.filter(search_vector="recipe").count(), 2)
+
 
 class FavouriteUrlTestCase(BaseTestCase):
     def setUp(self):
@@ -72,6 +100,63 @@ class FavouriteUrlTestCase(BaseTestCase):
         with self.assertRaises(ValidationError):
             fav_url.save(category=self.other_category)
 
+    def test_user_cannot_add_other_tags_mixed_with_own_tags(self):
+        fav_url = self.given_a_favourite_url(self.user)
+        tag = self.given_a_favourite_tag(user=self.user)
+        with self.assertRaises(ValidationError):
+            fav_url.tags.add(tag, self.other_tag)
+
+    def test_user_cannot_save_other_tags_mixed_with_own_tags(self):
+        fav_url = self.given_a_favourite_url(self.user)
+        tag = self.given_a_favourite_tag(user=self.user)
+        with self.assertRaises(ValidationError):
+            fav_url.save(tags=[tag, self.other_tag])
+
+    def test_user_cannot_add_favourite_url_to_other_tag(self):
+        fav_url = self.given_a_favourite_url(self.user)
+        with self.assertRaises(ValidationError):
+            self.other_tag.favouriteurl_set.add(fav_url)
+
+    def test_tag_ownership_check_does_not_grow_with_tags(self):
+        tags = [
+            self.given_a_favourite_tag(user=self.user, name=f"tag {i}")
+            for i in range(20)
+        ]
+        fav_url = self.given_a_favourite_url(self.user)
+        with CaptureQueriesContext(connection) as one_tag:
+            fav_url.tags.set(tags[:1])
+            fav_url.save(tags=tags[:1])
+        fav_url.tags.clear()
+        with CaptureQueriesContext(connection) as many_tags:
+            fav_url.tags.set(tags)
+            fav_url.save(tags=tags)
+        self.assertEqual(len(many_tags), len(one_tag))
+        self.assertEqual(fav_url.tags.count(), 20)
+
+    def test_favourite_url_links_existing_valid_url_on_save(self):
+        valid_url = ValidUrl.objects.create(url="https://test.com", is_valid=True)
+        fav_url = self.given_a_favourite_url(self.user, url="https://test.com")
+        self.assertEqual(fav_url.valid_url, valid_url)
+        self.assertTrue(fav_url.is_valid)
+
+    def test_favourite_url_is_linked_when_valid_url_is_created(self):
+        fav_url = self.given_a_favourite_url(self.user, url="https://test.com")
+        self.assertIsNone(fav_url.valid_url)
+        valid_url = ValidUrl.objects.create(url="https://test.com", is_valid=True)
+        fav_url.refresh_from_db()
+        self.assertEqual(fav_url.valid_url, valid_url)
+
+    def test_favourite_url_relinks_valid_url_when_url_changes(self):
+        ValidUrl.objects.create(url="https://test.com", is_valid=True)
+        other_valid_url = ValidUrl.objects.create(url="https://other.com")
+        fav_url = self.given_a_favourite_url(self.user, url="https://test.com")
+        fav_url = FavouriteUrl.objects.get(id=fav_url.id)
+        fav_url.url = "https://other.com"
+        fav_url.save()
+        fav_url.refresh_from_db()
+        self.assertEqual(fav_url.valid_url, other_valid_url)
+        self.assertFalse(fav_url.is_valid)
+
     def test_user_cannot_add_other_categories_on_save_favourite_url(self):
         with self.assertRaises(ValidationError):
             FavouriteUrl.objects.create(
@@ -80,3 +165,41 @@ class FavouriteUrlTestCase(BaseTestCase):
                 title="title",
                 category=self.other_category,
             )
+
+
+@override_settings(URL_VALIDATION_MIN_INTERVAL=3600, URL_VALIDATION_MAX_INTERVAL=86400)
+class ValidUrlScheduleTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.valid_url = ValidUrl(
+            url="https://test.com", is_valid=True, checked_at=self.now
+        )
+
+    def test_changed_url_is_checked_again_after_min_interval(self):
+        self.valid_url.schedule_next_check(changed=True)
+        self.assertEqual(self.valid_url.last_changed_at, self.now)
+        self.assertEqual(self.valid_url.next_check_at, self.now + timedelta(hours=1))
+
+    def test_stable_url_interval_grows_up_to_max_interval(self):
+        self.valid_url.last_changed_at = self.now - timedelta(hours=10)
+        self.valid_url.schedule_next_check(changed=False)
+        self.assertEqual(self.valid_url.next_check_at, self.now + timedelta(hours=5))
+
+        self.valid_url.last_changed_at = self.now - timedelta(days=30)
+        self.valid_url.schedule_next_check(changed=False)
+        self.assertEqual(self.valid_url.next_check_at, self.now + timedelta(days=1))
+
+    def test_failing_url_backs_off_exponentially(self):
+        self.valid_url.is_valid = False
+        for failures, hours in [(1, 1), (2, 2), (3, 4)]:
+            self.valid_url.schedule_next_check(changed=failures == 1)
+            self.assertEqual(self.valid_url.consecutive_failures, failures)
+            self.assertEqual(
+                self.valid_url.next_check_at, self.now + timedelta(hours=hours)
+            )
+
+    def test_success_resets_consecutive_failures(self):
+        self.valid_url.consecutive_failures = 3
+        self.valid_url.schedule_next_check(changed=True)
+        self.assertEqual(self.valid_url.consecutive_failures, 0)
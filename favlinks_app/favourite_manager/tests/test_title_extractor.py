@@ -0,0 +1,67 @@
+from config.helpers import BaseTestCase
+from unittest.mock import MagicMock
+
+from favourite_manager.models import ValidUrl
+from favourite_manager.title_extractor import (
+    get_declared_charset,
+    is_html_response,
+    read_html_head,
+)
+
+
+class TitleExtractorTestCase(BaseTestCase):
+    def given_a_response(self, chunks, content_type="text/html; charset=utf-8"):
+        response = MagicMock()
+        response.headers = {"Content-Type": content_type}
+        response.iter_content.return_value = iter(chunks)
+        return response
+
+    def test_is_html_response_by_content_type(self):
+        self.assertTrue(is_html_response(self.given_a_response([])))
+        self.assertTrue(is_html_response(self.given_a_response([], "")))
+        self.assertFalse(is_html_response(self.given_a_response([], "application/pdf")))
+
+    def test_get_declared_charset(self):
+        self.assertEqual(
+            get_declared_charset(
+                self.given_a_response([], 'text/html; Charset="cp1251"')
+            ),
+            "cp1251",
+        )
+        self.assertIsNone(get_declared_charset(self.given_a_response([], "text/html")))
+
+    def test_read_html_head_stops_after_closing_title(self):
+        chunks = [b"<html><head><title>Hello</ti", b"tle>", b"<body>never read"]
+        response = self.given_a_response(chunks)
+        self.assertEqual(
+            read_html_head(response, max_bytes=1024),
+            b"<html><head><title>Hello</title>",
+        )
+
+    def test_read_html_head_is_capped_at_max_bytes(self):
+        response = self.given_a_response([b"a" * 10, b"b" * 10, b"c" * 10])
+        self.assertEqual(read_html_head(response, max_bytes=15), b"a" * 10 + b"b" * 5)
+
+    def test_get_title_from_streamed_head(self):
+        response = self.given_a_response([b"<HEAD><TITLE>Hello</TITLE>", b"rest"])
+        self.assertEqual(ValidUrl.get_title(response), "Hello")
+
+    def test_get_title_decodes_with_header_charset(self):
+        for charset, title in [("cp1251", "Привет"), ("shift_jis", "こんにちは")]:
+            response = self.given_a_response(
+                [f"<title>{title}</title>".encode(charset)],
+                f"text/html; charset={charset}",
+            )
+            self.assertEqual(ValidUrl.get_title(response), title)
+
+    def test_get_title_given_no_header_charset_uses_meta_charset(self):
+        response = self.given_a_response(
+            ['<meta charset="cp1251"><title>Привет</title>'.encode("cp1251")],
+            "text/html",
+        )
+        self.assertEqual(ValidUrl.get_title(response), "Привет")
+
+    def test_get_title_skips_non_html(self):
+        response = self.given_a_response([b"%PDF-1.4"], "application/pdf")
+        self.assertEqual(ValidUrl.get_title(response), "")
+        response.iter_content.assert_not_called()
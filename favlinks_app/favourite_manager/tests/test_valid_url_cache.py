@@ -0,0 +1,155 @@
+from dataclasses import FrozenInstanceError
+from unittest.mock import patch
+
+from config.helpers import BaseTestCase
+from django.core.cache import cache
+from django.test import override_settings
+from redis.exceptions import RedisError
+
+from favourite_manager import valid_url_cache
+from favourite_manager.models import FavouriteUrl, ValidUrl
+from favourite_manager.valid_url_cache import CachedValidUrl, LocalLRUCache
+
+
+class LocalLRUCacheTestCase(BaseTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRUCache(maxsize=2, timeout=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+
+    @patch("favourite_manager.valid_url_cache.time.monotonic")
+    def test_expires_entries(self, mock_monotonic):
+        lru = LocalLRUCache(maxsize=2, timeout=60)
+        mock_monotonic.return_value = 100
+        lru.set("a", 1)
+        mock_monotonic.return_value = 161
+        self.assertIsNone(lru.get("a"))
+
+
+class ValidUrlCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.valid_url = ValidUrl.objects.create(
+                url="https://google.com", title="Google", is_valid=True
+            )
+
+    def test_get_valid_url_reads_through(self):
+        cache.clear()
+        valid_url_cache.local_cache.clear()
+        with self.assertNumQueries(1):
+            valid_url_cache.get_valid_url(self.valid_url.url)
+        with self.assertNumQueries(0):
+            valid_url = valid_url_cache.get_valid_url(self.valid_url.url)
+        self.assertEqual(valid_url.id, self.valid_url.id)
+        self.assertEqual(valid_url.title, "Google")
+        self.assertTrue(valid_url.is_valid)
+
+    def test_get_valid_url_falls_back_to_shared_cache(self):
+        valid_url_cache.local_cache.clear()
+        with self.assertNumQueries(0):
+            valid_url = valid_url_cache.get_valid_url(self.valid_url.url)
+        self.assertEqual(valid_url.id, self.valid_url.id)
+
+    def test_get_valid_url_given_unknown_url_returns_none(self):
+        self.assertIsNone(valid_url_cache.get_valid_url("https://unknown.com"))
+
+    def test_get_valid_urls_queries_missing_urls_once(self):
+        ValidUrl.objects.create(url="https://facebook.com")
+        with self.assertNumQueries(1):
+            valid_urls = valid_url_cache.get_valid_urls(
+                [self.valid_url.url, "https://facebook.com", "https://unknown.com"]
+            )
+        self.assertEqual(set(valid_urls), {self.valid_url.url, "https://facebook.com"})
+
+    def test_save_writes_through(self):
+        self.valid_url.title = "New title"
+        self.valid_url.is_valid = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.valid_url.save()
+        with self.assertNumQueries(0):
+            valid_url = valid_url_cache.get_valid_url(self.valid_url.url)
+        self.assertEqual(valid_url.title, "New title")
+        self.assertFalse(valid_url.is_valid)
+
+    def test_delete_forgets_url(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.valid_url.delete()
+        self.assertIsNone(valid_url_cache.get_valid_url(self.valid_url.url))
+
+    @override_settings(VALID_URL_CACHE_GENERATION_INTERVAL=0)
+    def test_delete_in_another_process_clears_local_tier(self):
+        valid_url_cache.get_valid_url(self.valid_url.url)
+        # What forget_valid_url leaves behind in the shared cache, seen from a
+        # process whose local tier still holds the row
+        ValidUrl.objects.filter(id=self.valid_url.id).delete()
+        cache.delete(valid_url_cache.get_key(self.valid_url.url))
+        cache.incr(valid_url_cache.GENERATION_KEY)
+        self.assertIsNone(valid_url_cache.get_valid_url(self.valid_url.url))
+
+    def test_lookups_return_read_only_snapshots(self):
+        valid_url = valid_url_cache.get_valid_url(self.valid_url.url)
+        self.assertIsInstance(valid_url, CachedValidUrl)
+        self.assertEqual(valid_url.validation_status, self.valid_url.validation_status)
+        with self.assertRaises(FrozenInstanceError):
+            valid_url.title = "Changed"
+
+    def test_favourite_url_links_cached_valid_url_without_lookup(self):
+        user = self.given_a_new_user()
+        favourite_url = FavouriteUrl(user=user, url=self.valid_url.url)
+        with self.assertNumQueries(0):
+            favourite_url.sync_valid_url()
+        self.assertEqual(favourite_url.valid_url_id, self.valid_url.id)
+
+    def test_local_hits_skip_shared_cache_until_generation_is_due(self):
+        valid_url_cache.get_valid_url(self.valid_url.url)
+        with patch.object(valid_url_cache, "cache", wraps=cache) as mock_cache:
+            for _ in range(3):
+                valid_url_cache.get_valid_url(self.valid_url.url)
+            self.assertEqual(mock_cache.method_calls, [])
+
+            with patch("favourite_manager.valid_url_cache.time.monotonic") as clock:
+                checked_at = valid_url_cache.local_cache.generation_checked_at
+                clock.return_value = checked_at + 5
+                valid_url_cache.get_valid_url(self.valid_url.url)
+            self.assertEqual([call[0] for call in mock_cache.method_calls], ["get"])
+
+    def test_cache_unavailable_falls_back_to_database(self):
+        valid_url_cache.local_cache.clear()
+        with patch.object(valid_url_cache, "cache") as mock_cache, self.assertLogs(
+            valid_url_cache.logger, "WARNING"
+        ):
+            for method in (
+                "get",
+                "get_many",
+                "set",
+                "set_many",
+                "add",
+                "delete",
+                "incr",
+            ):
+                getattr(mock_cache, method).side_effect = RedisError
+
+            with self.assertNumQueries(1):
+                valid_url = valid_url_cache.get_valid_url(self.valid_url.url)
+            self.assertEqual(valid_url.id, self.valid_url.id)
+            valid_url_cache.local_cache.clear()
+            self.assertEqual(
+                set(valid_url_cache.get_valid_urls([self.valid_url.url])),
+                {self.valid_url.url},
+            )
+            self.assertTrue(valid_url_cache.acquire_fetch_lock(self.valid_url.url))
+            self.assertFalse(valid_url_cache.wait_for_fetch(self.valid_url.url))
+            valid_url_cache.release_fetch_lock(self.valid_url.url)
+
+            user = self.given_a_new_user()
+            with self.captureOnCommitCallbacks(execute=True):
+                FavouriteUrl.objects.create(user=user, url="https://new.com")
+                self.valid_url.delete()
+        self.assertTrue(FavouriteUrl.objects.filter(url="https://new.com").exists())
+        self.assertFalse(ValidUrl.objects.filter(id=self.valid_url.id).exists())
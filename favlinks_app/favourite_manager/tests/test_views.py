@@ -1,13 +1,26 @@
+import csv
+import io
+import json
 from config.helpers import BaseTestCase
 from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from redis.exceptions import RedisError
 from rest_framework.reverse import reverse
+from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
+from favourite_manager import valid_url_cache
+from favourite_manager.importer import parse_netscape_html
 from favourite_manager.models import (
     FavouriteCategory,
     FavouriteTag,
     FavouriteUrl,
+    ValidationStatus,
     ValidUrl,
 )
 
@@ -21,7 +34,99 @@ class FavouriteManagerBaseTestCase(BaseTestCase):
         self.other_category = self.given_a_favourite_category(user=self.other_user)
 
 
-# TODO: ValidUrlTestCase
+class ValidUrlTestCase(FavouriteManagerBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("validurl-validate"))
+
+    @patch("favourite_manager.http_client.get")
+    def test_validate_given_fresh_url_does_not_fetch(self, mock_get):
+        ValidUrl.objects.create(
+            url="https://google.com",
+            title="Google",
+            is_valid=True,
+            checked_at=timezone.now(),
+        )
+        response = self.when_user_posts_and_gets_json(
+            data={"url": "https://google.com"}
+        )
+        self.assertResponseSuccess()
+        self.assertEqual(response["title"], "Google")
+        self.assertEqual(response["validation_status"], ValidationStatus.VALID)
+        mock_get.assert_not_called()
+
+    @patch("favourite_manager.views.validate_url_and_update_title.delay")
+    def test_validate_given_new_url_queues_single_fetch(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.when_user_posts_and_gets_json(
+                data={"url": "https://google.com"}
+            )
+        self.assertResponseAccepted()
+        self.assertEqual(response["validation_status"], ValidationStatus.PENDING)
+        valid_url_obj = ValidUrl.objects.get(url="https://google.com")
+        mock_delay.assert_called_once_with(valid_url_obj.id, release_fetch_lock=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.when_user_posts_and_gets_json(data={"url": "https://google.com"})
+        self.assertResponseAccepted()
+        mock_delay.assert_called_once()
+
+    @patch("favourite_manager.http_client.get")
+    @patch("favourite_manager.models.BeautifulSoup")
+    def test_validate_sync_given_stale_url_fetches(self, mock_bs, mock_get):
+        ValidUrl.objects.create(
+            url="https://google.com",
+            title="Old",
+            is_valid=True,
+            checked_at=timezone.now() - timedelta(days=1),
+        )
+        mock_get.return_value.status_code = 200
+        mock_bs.return_value.title.string = "Google"
+        response = self.when_user_posts_and_gets_json(
+            data={"url": "https://google.com", "sync": True}
+        )
+        self.assertResponseSuccess()
+        self.assertEqual(response["title"], "Google")
+        mock_get.assert_called_once()
+        self.assertTrue(ValidUrl.objects.get(url="https://google.com").is_fresh())
+
+    @patch("favourite_manager.http_client.get")
+    def test_validate_sync_given_fetch_in_flight_waits_for_it(self, mock_get):
+        ValidUrl.objects.create(url="https://google.com")
+        valid_url_cache.acquire_fetch_lock("https://google.com")
+        with patch(
+            "favourite_manager.valid_url_cache.wait_for_fetch", return_value=True
+        ) as mock_wait:
+            self.when_user_posts_and_gets_json(
+                data={"url": "https://google.com", "sync": True}
+            )
+        self.assertResponseSuccess()
+        mock_wait.assert_called_once_with("https://google.com", timeout=5)
+        mock_get.assert_not_called()
+
+    @override_settings(URL_VALIDATION_SYNC_WAIT=0)
+    @patch("favourite_manager.http_client.get")
+    def test_validate_sync_given_slow_fetch_in_flight_accepts(self, mock_get):
+        ValidUrl.objects.create(url="https://google.com")
+        valid_url_cache.acquire_fetch_lock("https://google.com")
+        self.when_user_posts_and_gets_json(
+            data={"url": "https://google.com", "sync": True}
+        )
+        self.assertResponseAccepted()
+        mock_get.assert_not_called()
+
+    def test_validate_bad_request_given_no_url(self):
+        self.when_user_posts_and_gets_json(data={})
+        self.assertResponseBadRequest()
+
+    @patch("favourite_manager.views.validate_url_and_update_title.delay")
+    def test_validate_bad_request_given_invalid_url(self, mock_delay):
+        for url in ["not a url", "ftp://google.com", "https://" + "a" * 200 + ".com"]:
+            self.when_user_posts_and_gets_json(data={"url": url})
+            self.assertResponseBadRequest()
+        self.assertFalse(ValidUrl.objects.exists())
+        mock_delay.assert_not_called()
 
 
 class FavouriteTagTestCase(FavouriteManagerBaseTestCase):
@@ -66,6 +171,21 @@ class FavouriteTagTestCase(FavouriteManagerBaseTestCase):
         self.assertTagInResponse(self.response_json)
         self.assertTagEqualsResponse(self.user, self.response_json)
 
+    def test_list_tags_counts_urls_in_one_query(self):
+        self.given_a_favourite_url(self.user, tags=[self.user_tag_1])
+        for i in range(20):
+            self.given_a_favourite_tag(user=self.user, name=f"extra {i}")
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouritetag-list"))
+        # Session, user and the annotated tag list
+        with self.assertNumQueries(3):
+            self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertTagEqualsResponse(self.user, self.response_json)
+        counts = {tag["id"]: tag["associated_urls_count"] for tag in self.response_json}
+        self.assertEqual(counts[self.user_tag_1.id], 1)
+        self.assertEqual(counts[self.user_tag_2.id], 0)
+
     def test_list_favourite_categories_forbidden_given_not_logged_in(self):
         self.given_url(reverse("favouritetag-list"))
         self.when_user_gets_json()
@@ -237,6 +357,18 @@ class FavouriteCategoryTestCase(FavouriteManagerBaseTestCase):
         self.assertCategoryInResponse(self.response_json)
         self.assertCategoryEqualsResponse(self.user, self.response_json)
 
+    def test_list_categories_counts_urls_in_one_query(self):
+        self.given_a_favourite_url(self.user, category=self.user_category_1)
+        for i in range(20):
+            self.given_a_favourite_category(user=self.user, name=f"extra {i}")
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouritecategory-list"))
+        # Session, user and the annotated category list
+        with self.assertNumQueries(3):
+            self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertCategoryEqualsResponse(self.user, self.response_json)
+
     def test_list_forbidden_given_not_logged_in(self):
         self.given_url(reverse("favouritecategory-list"))
         self.when_user_gets_json()
@@ -494,6 +626,33 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
         self.assertFavUrlInResponse(self.response_json["results"])
         self.assertFavUrlEqualsResponse(self.user, self.response_json["results"])
 
+    def test_list_favourite_url_query_count_is_constant(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"page_size": 100})
+        with CaptureQueriesContext(connection) as small_page:
+            self.when_user_gets_json()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(10):
+                ValidUrl.objects.create(url=f"https://site{i}.com", is_valid=True)
+                self.given_a_favourite_url(
+                    self.user,
+                    url=f"https://site{i}.com",
+                    category=self.category,
+                    tags=[
+                        self.tag,
+                        self.given_a_favourite_tag(self.user, name=f"t{i}"),
+                    ],
+                )
+
+        # Session, user, count, page, categories and tags
+        with self.assertNumQueries(6):
+            self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(len(small_page), 6)
+        self.assertFavUrlEqualsResponse(self.user, self.response_json["results"])
+
     def test_list_favourite_url_forbidden_given_not_logged_in(self):
         self.given_url(reverse("favouriteurl-list"))
         self.when_user_gets_json()
@@ -565,6 +724,172 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
             self.response_json["results"][0]["id"], self.favourite_url_1.id
         )
 
+    def test_list_filter_by_is_valid_success(self):
+        ValidUrl.objects.create(url=self.favourite_url_2.url, is_valid=True)
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"is_valid": True})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json["count"], 1)
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.favourite_url_2.id
+        )
+        self.assertTrue(self.response_json["results"][0]["is_valid"])
+
+    def test_list_full_text_search_by_title_success(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"q": "google"})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json["count"], 1)
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.favourite_url_2.id
+        )
+
+    def test_list_full_text_search_ranks_title_over_tags(self):
+        self.given_a_favourite_url(
+            self.user, title="Cooking", url="cooking.com", tags=[self.tag]
+        )
+        self.tag.name = "recipes"
+        self.tag.save()
+        self.given_a_favourite_url(self.user, title="Recipes", url="recipes.com")
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"q": "recipe"})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json["count"], 4)
+        self.assertEqual(self.response_json["results"][0]["title"], "Recipes")
+
+    def test_list_full_text_search_follows_category_changes(self):
+        self.category.name = "Travel"
+        self.category.save()
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"q": "travel"})
+        self.when_user_gets_json()
+        self.assertEqual(self.response_json["count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.when_user_gets_json()
+        self.assertEqual(self.response_json["count"], 0)
+
+    def test_list_filter_by_similar_tolerates_typos(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"similar": "gogle"})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json["count"], 1)
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.favourite_url_2.id
+        )
+
+    def test_list_filter_by_similar_with_strict_threshold(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"similar": "gogle", "similar_threshold": 1})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json["count"], 0)
+
+    def test_list_filter_by_similar_with_lenient_threshold(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"similar": "goggles"})
+        self.when_user_gets_json()
+        self.assertEqual(self.response_json["count"], 0)
+
+        self.given_query_params({"similar": "goggles", "similar_threshold": 0.2})
+        with CaptureQueriesContext(connection) as queries:
+            self.when_user_gets_json()
+        self.assertEqual(self.response_json["count"], 1)
+        # Nothing is set on the connection that could leak into later queries
+        self.assertFalse([query for query in queries if "set_config" in query["sql"]])
+
+    def test_list_filter_by_similar_threshold_out_of_range(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"similar": "gogle", "similar_threshold": 2})
+        self.when_user_gets_json()
+        self.assertResponseBadRequest()
+
+    def test_list_cursor_pagination_without_count(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"pagination": "cursor", "page_size": 1})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertNotIn("count", self.response_json)
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.favourite_url_2.id
+        )
+        self.assertIsNone(self.response_json["previous"])
+
+        self.given_url(self.response_json["next"])
+        self.given_query_params({})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.favourite_url_1.id
+        )
+        self.assertIsNone(self.response_json["next"])
+
+    def test_list_cursor_pagination_follows_ordering(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.given_query_params({"pagination": "cursor", "ordering": "updated_at"})
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(
+            [favurl["id"] for favurl in self.response_json["results"]],
+            list(
+                FavouriteUrl.objects.filter(user=self.user)
+                .order_by("updated_at", "id")
+                .values_list("id", flat=True)
+            ),
+        )
+
+    def test_list_cursor_pagination_given_duplicate_and_null_titles(self):
+        for i in range(5):
+            self.given_a_favourite_url(self.user, url=f"https://same{i}.com")
+            self.given_a_favourite_url(
+                self.user, url=f"https://none{i}.com", title=None
+            )
+        FavouriteUrl.objects.filter(user=self.user).update(updated_at=timezone.now())
+        expected = set(
+            FavouriteUrl.objects.filter(user=self.user).values_list("id", flat=True)
+        )
+        for ordering in ["title", "-updated_at"]:
+            self.given_logged_in_user(self.user)
+            self.given_url(reverse("favouriteurl-list"))
+            self.given_query_params(
+                {"pagination": "cursor", "ordering": ordering, "page_size": 3}
+            )
+            seen = []
+            while self.url:
+                self.when_user_gets_json()
+                self.assertResponseSuccess()
+                seen += [favurl["id"] for favurl in self.response_json["results"]]
+                self.given_url(self.response_json["next"])
+                self.given_query_params({})
+            self.assertEqual(len(seen), len(expected))
+            self.assertEqual(set(seen), expected)
+
+    def test_list_cursor_pagination_bad_request_given_ranked_filter(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        for param in ["q", "similar"]:
+            self.given_query_params({"pagination": "cursor", param: "google"})
+            self.when_user_gets_json()
+            self.assertResponseBadRequest()
+            self.assertEqual(
+                self.response_json,
+                {"error": f"Cursor pagination cannot be combined with {param}"},
+            )
+
     def test_list_filter_by_created_after_success(self):
         self.given_logged_in_user(self.user)
         self.given_url(reverse("favouriteurl-list"))
@@ -628,7 +953,7 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
         self.when_user_gets_json()
         self.assertResponseNotFound()
 
-    @patch("favourite_manager.models.requests.get")
+    @patch("favourite_manager.http_client.get")
     @patch("favourite_manager.models.BeautifulSoup")
     def test_create_success(self, mock_bs, mock_requests_get):
         new_fav_url = "https://facebook.com"
@@ -650,7 +975,7 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
             1,
         )
 
-    @patch("favourite_manager.models.requests.get")
+    @patch("favourite_manager.http_client.get")
     @patch("favourite_manager.models.BeautifulSoup")
     def test_create_success_with_default_title(self, mock_bs, mock_requests_get):
         initial_valid_url_count = ValidUrl.objects.count()
@@ -678,7 +1003,9 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
     def test_create_fail_with_is_valid_false_valid_url_object(self):
         initial_count = self.get_favourite_url_count()
         new_fav_url = "https://facebook.com"
-        ValidUrl.objects.create(url=new_fav_url, title="random")
+        ValidUrl.objects.create(
+            url=new_fav_url, title="random", checked_at=timezone.now()
+        )
         self.given_logged_in_user(self.user)
         self.given_url(reverse("favouriteurl-list"))
         self.when_user_posts_and_gets_json(data={"url": new_fav_url})
@@ -699,6 +1026,79 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
             1,
         )
 
+    @override_settings(URL_VALIDATION_SYNC_WAIT=0)
+    @patch("favourite_manager.views.validate_url_and_update_title.delay")
+    @patch("favourite_manager.http_client.get")
+    @patch("favourite_manager.models.BeautifulSoup")
+    def test_create_given_url_pending_validation_fetches_it(
+        self, mock_bs, mock_requests_get, mock_delay
+    ):
+        new_fav_url = "https://facebook.com"
+        mock_requests_get.return_value.status_code = 200
+        mock_bs.return_value.title.string = "Facebook"
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("validurl-validate"))
+        self.when_user_posts_and_gets_json(data={"url": new_fav_url})
+        self.assertResponseAccepted()
+
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_posts_and_gets_json(data={"url": new_fav_url})
+        self.assertResponseCreated()
+        self.assertEqual(self.response_json["title"], "Facebook")
+        self.assertEqual(
+            self.response_json["validation_status"], ValidationStatus.VALID
+        )
+        mock_requests_get.assert_called_once()
+
+    @override_settings(ASYNC_URL_VALIDATION=True)
+    @patch("favourite_manager.views.validate_url_and_update_title.delay")
+    def test_create_async_validation_accepts_pending_url(self, mock_delay):
+        new_fav_url = "https://facebook.com"
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.when_user_posts_and_gets_json(data={"url": new_fav_url})
+        self.assertResponseCreated()
+        self.assertEqual(
+            self.response_json["validation_status"], ValidationStatus.PENDING
+        )
+        valid_url_obj = ValidUrl.objects.get(url=new_fav_url)
+        mock_delay.assert_called_once_with(valid_url_obj.id)
+        self.assertTrue(
+            FavouriteUrl.objects.filter(user=self.user, url=new_fav_url).exists()
+        )
+
+    @override_settings(ASYNC_URL_VALIDATION=True)
+    def test_create_async_validation_rejects_checked_invalid_url(self):
+        initial_count = self.get_favourite_url_count()
+        new_fav_url = "https://facebook.com"
+        ValidUrl.objects.create(url=new_fav_url, checked_at=timezone.now())
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_posts_and_gets_json(data={"url": new_fav_url})
+        self.assertResponseBadRequest()
+        self.assertEqual(initial_count, self.get_favourite_url_count())
+
+    @patch("favourite_manager.http_client.get")
+    @patch("favourite_manager.models.BeautifulSoup")
+    def test_validate_task_updates_pending_favourite_title(
+        self, mock_bs, mock_requests_get
+    ):
+        from favourite_manager.celery import validate_url_and_update_title
+
+        new_fav_url = "https://facebook.com"
+        mock_requests_get.return_value.status_code = 200
+        mock_bs.return_value.title.string = "Fetched title"
+        valid_url_obj = ValidUrl.objects.create(url=new_fav_url)
+        fav_url = FavouriteUrl.objects.create(user=self.user, url=new_fav_url)
+
+        validate_url_and_update_title(valid_url_obj.id)
+
+        valid_url_obj.refresh_from_db()
+        fav_url.refresh_from_db()
+        self.assertEqual(valid_url_obj.validation_status, ValidationStatus.VALID)
+        self.assertEqual(fav_url.title, "Fetched title")
+
     def test_create_with_category_success(self):
         new_fav_url = "https://facebook.com"
         ValidUrl.objects.create(url=new_fav_url, title="random", is_valid=True)
@@ -742,6 +1142,69 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
             1,
         )
 
+    def test_create_with_tags_query_count_does_not_grow(self):
+        tags = [
+            self.given_a_favourite_tag(user=self.user, name=f"new tag {i}")
+            for i in range(20)
+        ]
+        ValidUrl.objects.create(url="https://facebook.com", is_valid=True)
+        ValidUrl.objects.create(url="https://google.com", is_valid=True)
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        with CaptureQueriesContext(connection) as one_tag:
+            self.when_user_posts_and_gets_json(
+                data={
+                    "url": "https://facebook.com",
+                    "category": self.category.id,
+                    "tags": [tags[0].id],
+                }
+            )
+        self.assertResponseCreated()
+        with self.assertNumQueries(len(one_tag)):
+            self.when_user_posts_and_gets_json(
+                data={
+                    "url": "https://google.com",
+                    "category": self.category.id,
+                    "tags": [tag.id for tag in tags],
+                }
+            )
+        self.assertResponseCreated()
+        self.assertEqual(
+            FavouriteUrl.objects.get(
+                user=self.user, url="https://google.com"
+            ).tags.count(),
+            20,
+        )
+
+    def test_update_tags_query_count(self):
+        tags = [
+            self.given_a_favourite_tag(user=self.user, name=f"new tag {i}")
+            for i in range(20)
+        ]
+        self.favourite_url_1.tags.set(tags[:10])
+        ValidUrl.objects.create(url="https://test.com", is_valid=True)
+        self.given_logged_in_user(self.user)
+        self.given_url(
+            reverse("favouriteurl-detail", kwargs={"pk": self.favourite_url_1.pk})
+        )
+        # Session, user, favourite, duplicate check, ValidUrl, category, tags,
+        # then savepoint, current tags, delete, insert, row, search vector,
+        # release, and the tags and validation status of the response
+        with self.assertNumQueries(16):
+            response = self.when_user_puts_and_gets_json(
+                data={
+                    "url": "https://test.com",
+                    "category": self.category.id,
+                    "tags": [tag.id for tag in tags[5:]],
+                }
+            )
+        self.assertResponseSuccess()
+        self.assertCountEqual(response["tags"], [tag.id for tag in tags[5:]])
+        self.assertCountEqual(
+            self.favourite_url_1.tags.values_list("id", flat=True),
+            [tag.id for tag in tags[5:]],
+        )
+
     def test_create_with_other_category_ignores(self):
         new_fav_url = "https://facebook.com"
         ValidUrl.objects.create(url=new_fav_url, title="random", is_valid=True)
@@ -923,3 +1386,340 @@ class FavouriteUrlTestCase(FavouriteManagerBaseTestCase):
         self.assertTrue(
             FavouriteUrl.objects.filter(pk=self.favourite_url_1.pk).exists()
         )
+
+    def when_user_bulk_posts(self, data):
+        self.given_url(reverse("favouriteurl-bulk"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.when_user_posts_and_gets_json(data=data)
+
+    @patch("favourite_manager.bulk.validate_urls_and_update_favourite_titles.delay")
+    def test_bulk_create_and_update_success(self, mock_delay):
+        existing = self.given_a_favourite_url(
+            self.user, url="https://existing.com", title="Old"
+        )
+        ValidUrl.objects.create(
+            url="https://broken.com", checked_at=timezone.now(), is_valid=False
+        )
+        self.given_logged_in_user(self.user)
+        self.when_user_bulk_posts(
+            [
+                {
+                    "url": "https://new.com",
+                    "category": self.category.id,
+                    "tags": [self.tag.id, self.other_tag.id],
+                },
+                {"url": "https://existing.com", "title": "New", "tags": []},
+                {"url": "https://new.com", "title": "Again"},
+                {"url": "https://broken.com"},
+                {"url": "not a url"},
+            ]
+        )
+        self.assertResponseSuccess()
+        results = self.response_json["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "updated", "error", "error", "error"],
+        )
+        self.assertIn("url", results[4]["errors"])
+
+        created = FavouriteUrl.objects.get(id=results[0]["id"])
+        self.assertEqual(created.user, self.user)
+        self.assertEqual(created.category, self.category)
+        self.assertEqual(list(created.tags.all()), [self.tag])
+        self.assertEqual(created.valid_url.url, "https://new.com")
+        self.assertEqual(results[1]["id"], existing.id)
+        existing.refresh_from_db()
+        self.assertEqual(existing.title, "New")
+        self.assertFalse(FavouriteUrl.objects.filter(url="https://broken.com").exists())
+        mock_delay.assert_called_once()
+        self.assertCountEqual(
+            mock_delay.call_args.args[0],
+            [created.valid_url_id, existing.valid_url_id],
+        )
+
+    @patch("favourite_manager.bulk.validate_urls_and_update_favourite_titles.delay")
+    def test_bulk_create_query_count_does_not_grow(self, mock_delay):
+        self.given_logged_in_user(self.user)
+        with CaptureQueriesContext(connection) as small:
+            self.when_user_bulk_posts(
+                [
+                    {"url": f"https://small{i}.com", "tags": [self.tag.id]}
+                    for i in range(2)
+                ]
+            )
+        with CaptureQueriesContext(connection) as large:
+            self.when_user_bulk_posts(
+                [
+                    {"url": f"https://large{i}.com", "tags": [self.tag.id]}
+                    for i in range(50)
+                ]
+            )
+        self.assertResponseSuccess()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(FavouriteUrl.objects.filter(tags=self.tag).count(), 54)
+
+    def test_bulk_create_bad_request_given_no_list(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-bulk"))
+        self.when_user_posts_and_gets_json(data={"url": "https://new.com"})
+        self.assertResponseBadRequest()
+
+    @override_settings(FAVOURITE_BULK_MAX_ITEMS=1)
+    def test_bulk_create_bad_request_given_too_many_items(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-bulk"))
+        self.when_user_posts_and_gets_json(
+            data=[{"url": "https://a.com"}, {"url": "https://b.com"}]
+        )
+        self.assertResponseBadRequest()
+
+    def test_bulk_delete_success(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-bulk"))
+        self.response = self.client.delete(
+            self.url,
+            {
+                "ids": [
+                    self.favourite_url_1.id,
+                    self.other_favourite_url.id,
+                    self.favourite_url_1.id,
+                ]
+            },
+            format="json",
+        )
+        self.assertResponseSuccess()
+        self.assertEqual(
+            self.response.json()["results"],
+            [
+                {"id": self.favourite_url_1.id, "status": "deleted"},
+                {"id": self.other_favourite_url.id, "status": "not_found"},
+            ],
+        )
+        self.assertFalse(
+            FavouriteUrl.objects.filter(pk=self.favourite_url_1.pk).exists()
+        )
+        self.assertTrue(
+            FavouriteUrl.objects.filter(pk=self.other_favourite_url.pk).exists()
+        )
+
+    @patch("favourite_manager.bulk.validate_urls_and_update_favourite_titles.delay")
+    def test_import_bookmarks_success(self, mock_delay):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-import"))
+        upload = SimpleUploadedFile(
+            "bookmarks.html",
+            b"<DL><p><DT><H3>Imported</H3><DL><p>"
+            b'<DT><A HREF="https://imported.com/">Imported</A></DL><p></DL>',
+        )
+        self.when_user_posts_and_gets_json(data={"file": upload}, format="multipart")
+        self.assertResponseSuccess()
+        self.assertEqual(self.response_json, {"created": 1, "updated": 0, "failed": 0})
+        favourite_url = FavouriteUrl.objects.get(
+            user=self.user, url="https://imported.com/"
+        )
+        self.assertEqual(favourite_url.category.name, "Imported")
+
+    def test_import_bookmarks_bad_request_given_no_file(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-import"))
+        self.when_user_posts_and_gets_json(data={}, format="multipart")
+        self.assertResponseBadRequest()
+
+    @override_settings(BOOKMARK_IMPORT_SYNC_MAX_SIZE=16)
+    @patch("favourite_manager.views.import_bookmarks_file.delay")
+    def test_import_bookmarks_queues_large_file(self, mock_import_delay):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-import"))
+        upload = SimpleUploadedFile(
+            "bookmarks.html", b'<DT><A HREF="https://imported.com/">Imported</A>'
+        )
+        with TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.when_user_posts_and_gets_json(
+                    data={"file": upload}, format="multipart"
+                )
+            self.assertResponseAccepted()
+            self.assertEqual(self.response_json, {"status": "queued"})
+            user_id, path, bookmark_format = mock_import_delay.call_args.args
+            self.assertEqual((user_id, bookmark_format), (self.user.id, "html"))
+            self.assertTrue(default_storage.exists(path))
+        self.assertFalse(
+            FavouriteUrl.objects.filter(url="https://imported.com/").exists()
+        )
+
+    @override_settings(BOOKMARK_IMPORT_MAX_UPLOAD_SIZE=16)
+    @patch("favourite_manager.views.BookmarkImporter")
+    def test_import_bookmarks_bad_request_given_file_too_large(self, mock_importer):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-import"))
+        upload = SimpleUploadedFile(
+            "bookmarks.html", b'<DT><A HREF="https://imported.com/">Imported</A>'
+        )
+        self.when_user_posts_and_gets_json(data={"file": upload}, format="multipart")
+        self.assertResponseBadRequest()
+        self.assertEqual(
+            self.response_json, {"error": "Bookmark files are limited to 16 bytes"}
+        )
+        mock_importer.assert_not_called()
+
+    def when_user_exports(self, export_format):
+        self.given_url(reverse("favouriteurl-export"))
+        self.given_query_params({"file_format": export_format})
+        self.response = self.client.get(self.url, self.query_params)
+        return b"".join(self.response.streaming_content).decode()
+
+    def test_export_ndjson_success(self):
+        self.given_logged_in_user(self.user)
+        content = self.when_user_exports("ndjson")
+        self.assertResponseSuccess()
+        self.assertEqual(self.response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [row["id"] for row in rows],
+            [self.favourite_url_1.id, self.favourite_url_2.id],
+        )
+        self.assertEqual(rows[0]["category"], self.category.name)
+        self.assertEqual(rows[0]["tags"], [self.tag.name])
+
+    def test_export_csv_success(self):
+        self.given_logged_in_user(self.user)
+        content = self.when_user_exports("csv")
+        self.assertResponseSuccess()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]["url"], self.favourite_url_2.url)
+        self.assertEqual(rows[1]["tags"], self.tag.name)
+
+    def test_export_html_can_be_imported(self):
+        self.given_logged_in_user(self.user)
+        content = self.when_user_exports("html")
+        self.assertResponseSuccess()
+        entries = list(parse_netscape_html(io.StringIO(content)))
+        self.assertEqual(
+            [(entry["url"], entry["folder"], entry["tags"]) for entry in entries],
+            [
+                (self.favourite_url_1.url, self.category.name, [self.tag.name]),
+                (self.favourite_url_2.url, None, [self.tag.name]),
+            ],
+        )
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_export_html_in_chunks_without_server_side_cursors(self):
+        self.given_logged_in_user(self.user)
+        with patch.dict(
+            connection.settings_dict, {"DISABLE_SERVER_SIDE_CURSORS": True}
+        ):
+            content = self.when_user_exports("html")
+        self.assertResponseSuccess()
+        entries = list(parse_netscape_html(io.StringIO(content)))
+        self.assertEqual(
+            [(entry["url"], entry["folder"], entry["tags"]) for entry in entries],
+            [
+                (self.favourite_url_1.url, self.category.name, [self.tag.name]),
+                (self.favourite_url_2.url, None, [self.tag.name]),
+            ],
+        )
+
+    def test_export_filtered_by_title(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-export"))
+        self.response = self.client.get(self.url, {"title": "google"})
+        content = b"".join(self.response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_export_bad_request_given_unknown_format(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-export"))
+        self.given_query_params({"file_format": "xml"})
+        self.when_user_gets_json()
+        self.assertResponseBadRequest()
+
+    def test_list_served_from_cache_until_write(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        # Only the session and user lookups of the authentication
+        with self.assertNumQueries(2):
+            self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.favourite_url_2.tags.clear()
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        self.assertEqual(
+            [
+                favurl["tags"]
+                for favurl in self.response_json["results"]
+                if favurl["id"] == self.favourite_url_2.id
+            ],
+            [[]],
+        )
+
+    def test_list_cache_is_per_user_and_query(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_gets_json()
+        self.given_query_params({"url": "google"})
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        self.assertEqual(self.response_json["count"], 1)
+
+        self.given_logged_in_user(self.other_user)
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        self.assertEqual(
+            self.response_json["results"][0]["id"], self.other_favourite_url.id
+        )
+
+    @patch("favourite_manager.cache.cache.get", side_effect=RedisError)
+    def test_list_served_uncached_given_cache_unavailable(self, mock_get):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_gets_json()
+        self.assertResponseSuccess()
+        self.assertEqual(self.response["X-Cache"], "BYPASS")
+        self.assertEqual(self.response_json["count"], 2)
+
+        with patch("favourite_manager.cache.cache.incr", side_effect=RedisError):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.favourite_url_2.delete()
+        self.when_user_gets_json()
+        self.assertEqual(self.response_json["count"], 1)
+
+    def test_list_cache_invalidated_only_after_commit(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouriteurl-list"))
+        self.when_user_gets_json()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.favourite_url_2.delete()
+            # A read before the commit may still be served the old rows
+            self.when_user_gets_json()
+            self.assertEqual(self.response["X-Cache"], "HIT")
+        for callback in callbacks:
+            callback()
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        self.assertEqual(self.response_json["count"], 1)
+
+    def test_category_list_cache_invalidated_by_favourite_write(self):
+        self.given_logged_in_user(self.user)
+        self.given_url(reverse("favouritecategory-list"))
+        self.when_user_gets_json()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.given_a_favourite_url(
+                self.user, url="https://another.com", category=self.category
+            )
+        self.when_user_gets_json()
+        self.assertEqual(self.response["X-Cache"], "MISS")
+        self.assertEqual(
+            [
+                category["associated_urls_count"]
+                for category in self.response_json
+                if category["id"] == self.category.id
+            ],
+            [2],
+        )
@@ -0,0 +1,36 @@
+import re
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+HEAD_END_RE = re.compile(rb"</(title|head)\s*>", re.IGNORECASE)
+
+
+def is_html_response(response):
+    content_type = response.headers.get("Content-Type")
+    if not isinstance(content_type, str) or not content_type:
+        # Servers that omit the header are given the benefit of the doubt
+        return True
+    return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def get_declared_charset(response):
+    # Only what the header states: requests falls back to ISO-8859-1 for any
+    # text/* response, which would override a <meta charset> in the page
+    content_type = response.headers.get("Content-Type")
+    if not isinstance(content_type, str):
+        return None
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip("\"'") or None
+    return None
+
+
+def read_html_head(response, max_bytes, chunk_size=8192):
+    head = bytearray()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        # Back up a little so a closing tag split across chunks is still found
+        search_from = max(len(head) - 8, 0)
+        head.extend(chunk)
+        if len(head) >= max_bytes or HEAD_END_RE.search(head, search_from):
+            break
+    return bytes(head[:max_bytes])
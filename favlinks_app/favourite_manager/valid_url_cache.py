@@ -0,0 +1,263 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+KEY = "favlinks:validurl:{digest}"
+# Bumped on every delete; a process seeing a new value drops its local tier
+GENERATION_KEY = "favlinks:validurl-generation"
+FETCH_LOCK_KEY = "favlinks:validurl-fetch:{digest}"
+FETCH_POLL_INTERVAL = 0.1
+CACHED_FIELDS = ["id", "title", "is_valid", "checked_at", "updated_at"]
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    """Bounded per-process tier in front of the shared cache."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.generation = None
+        self.generation_checked_at = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation_checked_at = None
+
+    def generation_is_due(self, interval):
+        # Claims the check, so one lookup per interval reads the generation
+        with self.lock:
+            now = time.monotonic()
+            if (
+                self.generation_checked_at is not None
+                and now - self.generation_checked_at < interval
+            ):
+                return False
+            self.generation_checked_at = now
+            return True
+
+    def sync_generation(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+
+
+local_cache = LocalLRUCache(
+    settings.VALID_URL_CACHE_LOCAL_SIZE, settings.VALID_URL_CACHE_LOCAL_TIMEOUT
+)
+
+
+def get_key(url, key=KEY):
+    # URLs can be longer than cache backends allow for keys
+    return key.format(digest=hashlib.sha1(url.encode()).hexdigest())
+
+
+@dataclass(frozen=True)
+class CachedValidUrl:
+    """Read-only snapshot of a ValidUrl row; load the row to change it."""
+
+    id: int
+    url: str
+    title: Optional[str]
+    is_valid: bool
+    checked_at: Optional[datetime]
+    updated_at: datetime
+
+    @property
+    def validation_status(self):
+        from favourite_manager.models import ValidationStatus
+
+        return ValidationStatus.from_check(self.checked_at, self.is_valid)
+
+    def is_fresh(self, max_age=None):
+        from favourite_manager.models import ValidUrl
+
+        return ValidUrl.is_fresh(self, max_age)
+
+
+def to_entry(valid_url_obj):
+    return {field: getattr(valid_url_obj, field) for field in CACHED_FIELDS}
+
+
+def from_entry(url, entry):
+    return CachedValidUrl(url=url, **entry)
+
+
+def sync_generation():
+    if not local_cache.generation_is_due(settings.VALID_URL_CACHE_GENERATION_INTERVAL):
+        return
+    try:
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            # Seeded from the clock so an evicted counter never reuses an old value
+            cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+            generation = cache.get(GENERATION_KEY)
+    except RedisError:
+        # Local entries still expire with their own timeout
+        logger.warning("ValidUrl cache unavailable", exc_info=True)
+        return
+    local_cache.sync_generation(generation)
+
+
+def get_valid_url(url):
+    from favourite_manager.models import ValidUrl
+
+    sync_generation()
+    entry = local_cache.get(url)
+    if entry is None:
+        try:
+            entry = cache.get(get_key(url))
+        except RedisError:
+            logger.warning("ValidUrl cache unavailable", exc_info=True)
+        if entry is None:
+            valid_url_obj = ValidUrl.objects.filter(url=url).first()
+            if valid_url_obj is None:
+                return None
+            entry = to_entry(valid_url_obj)
+            store_valid_url(valid_url_obj)
+        else:
+            local_cache.set(url, entry)
+    return from_entry(url, entry)
+
+
+def get_valid_urls(urls):
+    from favourite_manager.models import ValidUrl
+
+    sync_generation()
+    found = {}
+    missing = []
+    for url in urls:
+        entry = local_cache.get(url)
+        if entry is None:
+            missing.append(url)
+        else:
+            found[url] = from_entry(url, entry)
+
+    keys = {get_key(url): url for url in missing}
+    try:
+        entries = cache.get_many(keys)
+    except RedisError:
+        logger.warning("ValidUrl cache unavailable", exc_info=True)
+        entries = {}
+    for key, entry in entries.items():
+        local_cache.set(keys[key], entry)
+        found[keys[key]] = from_entry(keys[key], entry)
+
+    missing = [url for url in missing if url not in found]
+    if missing:
+        valid_url_objs = list(ValidUrl.objects.filter(url__in=missing))
+        store_valid_urls(valid_url_objs)
+        found.update(
+            (obj.url, from_entry(obj.url, to_entry(obj))) for obj in valid_url_objs
+        )
+    return found
+
+
+def store_valid_url(valid_url_obj):
+    entry = to_entry(valid_url_obj)
+    try:
+        cache.set(get_key(valid_url_obj.url), entry, settings.VALID_URL_CACHE_TIMEOUT)
+    except RedisError:
+        logger.warning("ValidUrl cache unavailable", exc_info=True)
+    local_cache.set(valid_url_obj.url, entry)
+
+
+def store_valid_urls(valid_url_objs):
+    entries = {obj.url: to_entry(obj) for obj in valid_url_objs}
+    if not entries:
+        return
+    try:
+        cache.set_many(
+            {get_key(url): entry for url, entry in entries.items()},
+            settings.VALID_URL_CACHE_TIMEOUT,
+        )
+    except RedisError:
+        logger.warning("ValidUrl cache unavailable", exc_info=True)
+    for url, entry in entries.items():
+        local_cache.set(url, entry)
+
+
+def forget_valid_url(url):
+    local_cache.delete(url)
+    try:
+        cache.delete(get_key(url))
+        # Other processes may still hold the row in their local tier
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+    except RedisError:
+        # Shared entries of a deleted row expire with their timeout
+        logger.warning("Could not forget cached ValidUrl %s", url, exc_info=True)
+
+
+def acquire_fetch_lock(url):
+    # Only the caller that adds the key fetches the page, the others wait for it
+    try:
+        return cache.add(
+            get_key(url, FETCH_LOCK_KEY), True, settings.URL_VALIDATION_LOCK_TIMEOUT
+        )
+    except RedisError:
+        # Without the lock concurrent callers may fetch the page more than once
+        logger.warning("Fetch lock unavailable, fetching anyway", exc_info=True)
+        return True
+
+
+def release_fetch_lock(url):
+    try:
+        cache.delete(get_key(url, FETCH_LOCK_KEY))
+    except RedisError:
+        logger.warning("Could not release fetch lock of %s", url, exc_info=True)
+
+
+def wait_for_fetch(url, timeout=None):
+    key = get_key(url, FETCH_LOCK_KEY)
+    deadline = time.monotonic() + (
+        settings.URL_VALIDATION_LOCK_TIMEOUT if timeout is None else timeout
+    )
+    try:
+        while cache.get(key) is not None:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(FETCH_POLL_INTERVAL)
+    except RedisError:
+        logger.warning("Fetch lock unavailable", exc_info=True)
+        return False
+    return True
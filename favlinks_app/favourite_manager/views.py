@@ -1,27 +1,50 @@
-import requests
-from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from django_filters import rest_framework as filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from favourite_manager import valid_url_cache
+from favourite_manager.bulk import bulk_delete_favourite_urls, bulk_save_favourite_urls
+from favourite_manager.cache import CachedResponseMixin
+from favourite_manager.celery import (
+    import_bookmarks_file,
+    validate_url_and_update_title,
+)
+from favourite_manager.counters import get_favourite_url_quota_left
+from favourite_manager.exporter import EXPORT_FORMATS, export_favourite_urls
 from favourite_manager.filters import FavouriteUrlFilter
+from favourite_manager.importer import (
+    BookmarkImporter,
+    get_bookmark_format,
+    parse_bookmarks,
+)
 from favourite_manager.models import (
     FavouriteCategory,
     FavouriteTag,
     FavouriteUrl,
+    ValidationStatus,
     ValidUrl,
 )
 from favourite_manager.serializers import (
     ValidUrlSerializer,
+    ValidUrlValidateSerializer,
     FavouriteCategorySerializer,
     FavouriteTagSerializer,
     FavouriteUrlSerializer,
     FavouriteUrlCreateUpdateSerializer,
+    FavouriteUrlBulkItemSerializer,
+    FavouriteUrlBulkDeleteSerializer,
+    BookmarkImportSerializer,
 )
 
 
@@ -29,25 +52,53 @@ class ValidUrlViewSet(viewsets.GenericViewSet):
     @action(methods=["POST"], detail=False, serializer_class=ValidUrlSerializer)
     def validate(self, request):
         url = request.data.get("url", None)
-        title = None
         if not url:
             return Response(
                 {"error": "URL is required"}, status=status.HTTP_400_BAD_REQUEST
             )
+        params = ValidUrlValidateSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        url = params.validated_data["url"]
+
+        instance = valid_url_cache.get_valid_url(url)
+        if instance is not None and instance.is_fresh():
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        created = False
+        if instance is None:
+            instance, created = ValidUrl.objects.get_or_create(url=url)
+
+        # The page is only fetched while the request waits when asked for
+        if not params.validated_data["sync"]:
+            if valid_url_cache.acquire_fetch_lock(url):
+                transaction.on_commit(
+                    lambda: validate_url_and_update_title.delay(
+                        instance.id, release_fetch_lock=True
+                    )
+                )
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, "html.parser")
-                title = soup.title.string if soup.title else None
-                is_valid = True
+            if valid_url_cache.acquire_fetch_lock(url):
+                try:
+                    instance = ValidUrl.objects.get(id=instance.id)
+                    instance.validate_url_and_get_title()
+                finally:
+                    valid_url_cache.release_fetch_lock(url)
+                fetched = True
             else:
-                is_valid = False
+                # Another request or task is fetching the page: use its result if
+                # it lands soon, otherwise answer 202 rather than pin the worker
+                fetched = valid_url_cache.wait_for_fetch(
+                    url, timeout=settings.URL_VALIDATION_SYNC_WAIT
+                )
+                instance = ValidUrl.objects.get(id=instance.id)
 
-            instance, created = ValidUrl.objects.get_or_create(
-                url=url, defaults={"is_valid": is_valid, "title": title}
-            )
-            if created:
+            if not fetched:
+                status_code = status.HTTP_202_ACCEPTED
+            elif created:
                 status_code = status.HTTP_201_CREATED
             else:
                 status_code = status.HTTP_200_OK
@@ -60,12 +111,14 @@ class ValidUrlViewSet(viewsets.GenericViewSet):
             )
 
 
-class FavouriteCategoryViewSet(viewsets.ModelViewSet):
+class FavouriteCategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = FavouriteCategorySerializer
 
     def get_queryset(self):
-        return FavouriteCategory.objects.filter(user=self.request.user)
+        return FavouriteCategory.objects.filter(
+            user=self.request.user
+        ).with_urls_count()
 
     def create(self, request, *args, **kwargs):
         name = request.data.get("name", None)
@@ -84,12 +137,12 @@ class FavouriteCategoryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class FavouriteTagViewSet(viewsets.ModelViewSet):
+class FavouriteTagViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = FavouriteTagSerializer
 
     def get_queryset(self):
-        return FavouriteTag.objects.filter(user=self.request.user)
+        return FavouriteTag.objects.filter(user=self.request.user).with_urls_count()
 
     def create(self, request, *args, **kwargs):
         name = request.data.get("name", None)
@@ -114,7 +167,26 @@ class FavouriteUrlPagination(PageNumberPagination):
     page_size_query_param = "page_size"
 
 
-class FavouriteUrlViewSet(viewsets.ModelViewSet):
+class FavouriteUrlCursorPagination(CursorPagination):
+    # Keyset pages cost the same at any depth and skip the COUNT(*)
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    ordering = ("-created_at", "-id")
+    # Only the first field goes into the cursor and rows tied on it are stepped
+    # over by offset, so it has to be non-null; title is left to page numbers
+    ordering_fields = ("created_at", "updated_at")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[0].lstrip("-") not in self.ordering_fields:
+            return self.ordering
+        # id keeps rows tied on the first field in a stable order
+        id_ordering = "-id" if ordering[0].startswith("-") else "id"
+        return (ordering[0], id_ordering)
+
+
+class FavouriteUrlViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     serializer_class = FavouriteUrlSerializer
     pagination_class = FavouriteUrlPagination
@@ -126,8 +198,87 @@ class FavouriteUrlViewSet(viewsets.ModelViewSet):
 
     filterset_class = FavouriteUrlFilter
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            if request and request.query_params.get("pagination") == "cursor":
+                self._paginator = FavouriteUrlCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
-        return FavouriteUrl.objects.filter(user=self.request.user)
+        queryset = FavouriteUrl.objects.filter(user=self.request.user)
+        if self.action not in ("list", "retrieve"):
+            return queryset
+
+        # Everything the nested serializers read, in a fixed number of queries
+        return queryset.select_related("valid_url").prefetch_related(
+            Prefetch("category", queryset=FavouriteCategory.objects.with_urls_count()),
+            Prefetch("tags", queryset=FavouriteTag.objects.with_urls_count()),
+        )
+
+    def list(self, request, *args, **kwargs):
+        # Keyset pages would replace the rank ordering of these filters
+        ranked = [
+            param for param in ("q", "similar") if request.query_params.get(param)
+        ]
+        if ranked and request.query_params.get("pagination") == "cursor":
+            return Response(
+                {
+                    "error": "Cursor pagination cannot be combined with {}".format(
+                        " or ".join(ranked)
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return super().list(request, *args, **kwargs)
+
+    def get_valid_url(self, url):
+        valid_url_obj = valid_url_cache.get_valid_url(url)
+        if valid_url_obj is None:
+            valid_url_obj, created = ValidUrl.objects.get_or_create(url=url)
+            if created and settings.ASYNC_URL_VALIDATION:
+                transaction.on_commit(
+                    lambda: validate_url_and_update_title.delay(valid_url_obj.id)
+                )
+
+        # Rows left pending by the validate endpoint, bulk saves or imports are
+        # fetched now rather than rejected as invalid
+        if (
+            settings.ASYNC_URL_VALIDATION
+            or valid_url_obj.is_valid
+            or valid_url_obj.validation_status != ValidationStatus.PENDING
+        ):
+            return valid_url_obj
+        return self.fetch_pending_valid_url(url, valid_url_obj.id)
+
+    def fetch_pending_valid_url(self, url, valid_url_id):
+        locked = valid_url_cache.acquire_fetch_lock(url)
+        if not locked:
+            # Another request or task is fetching the page; only fetch it again
+            # if its result does not land in time
+            valid_url_cache.wait_for_fetch(
+                url, timeout=settings.URL_VALIDATION_SYNC_WAIT
+            )
+        try:
+            valid_url_obj = ValidUrl.objects.get(id=valid_url_id)
+            if valid_url_obj.validation_status == ValidationStatus.PENDING:
+                valid_url_obj.validate_url_and_get_title()
+                valid_url_obj.refresh_from_db()
+        finally:
+            if locked:
+                valid_url_cache.release_fetch_lock(url)
+        return valid_url_obj
+
+    def is_rejected_url(self, valid_url_obj):
+        if (
+            settings.ASYNC_URL_VALIDATION
+            and valid_url_obj.validation_status == ValidationStatus.PENDING
+        ):
+            return False
+        return not valid_url_obj.is_valid
 
     def create(self, request, *args, **kwargs):
         url = request.data.get("url", None)
@@ -143,12 +294,14 @@ class FavouriteUrlViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        valid_url_obj, created = ValidUrl.objects.get_or_create(url=url)
-        if created:
-            valid_url_obj.validate_url_and_get_title()
-            valid_url_obj.refresh_from_db()
+        if get_favourite_url_quota_left(request.user) == 0:
+            return Response(
+                {"error": "Favourite URL limit reached"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if not valid_url_obj.is_valid:
+        valid_url_obj = self.get_valid_url(url)
+        if self.is_rejected_url(valid_url_obj):
             return Response(
                 {"error": "URL is not valid"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -159,27 +312,26 @@ class FavouriteUrlViewSet(viewsets.ModelViewSet):
             data=request.data, context={"user": request.user}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, title=title)
+        serializer.save(user=request.user, title=title, valid_url_id=valid_url_obj.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         url = request.data.get("url", None)
         title = request.data.get("title", None)
+        valid_url_obj = None
 
         if url:
-            existing_url = FavouriteUrl.objects.filter(user=request.user, url=url)
-            if existing_url.exists() and existing_url.first() != instance:
+            existing_url = FavouriteUrl.objects.filter(
+                user=request.user, url=url
+            ).exclude(pk=instance.pk)
+            if existing_url.exists():
                 return Response(
                     {"error": "Favourite URL with this URL already exists"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            valid_url_obj, created = ValidUrl.objects.get_or_create(url=url)
-            if created:
-                valid_url_obj.validate_url_and_get_title()
-                valid_url_obj.refresh_from_db()
-
-            if not valid_url_obj.is_valid:
+            valid_url_obj = self.get_valid_url(url)
+            if self.is_rejected_url(valid_url_obj):
                 return Response(
                     {"error": "URL is not valid"},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -189,5 +341,107 @@ class FavouriteUrlViewSet(viewsets.ModelViewSet):
             instance, data=request.data, context={"user": request.user}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, title=title, url=url)
+        serializer.save(
+            user=request.user,
+            title=title,
+            url=url,
+            valid_url_id=valid_url_obj.id if valid_url_obj else None,
+        )
         return Response(serializer.data)
+
+    @action(methods=["POST", "DELETE"], detail=False)
+    def bulk(self, request):
+        if request.method == "DELETE":
+            serializer = FavouriteUrlBulkDeleteSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            results = bulk_delete_favourite_urls(
+                request.user, serializer.validated_data["ids"]
+            )
+            return Response({"results": results})
+
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {"error": "A list of favourite URLs is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(request.data) > settings.FAVOURITE_BULK_MAX_ITEMS:
+            return Response(
+                {
+                    "error": "At most {} favourite URLs per request".format(
+                        settings.FAVOURITE_BULK_MAX_ITEMS
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(request.data)
+        valid_items = []
+        for index, item in enumerate(request.data):
+            serializer = FavouriteUrlBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid_items.append((index, serializer.validated_data))
+            else:
+                results[index] = {"status": "error", "errors": serializer.errors}
+
+        saved = bulk_save_favourite_urls(
+            request.user, [item for _, item in valid_items]
+        )
+        for (index, _), result in zip(valid_items, saved):
+            results[index] = result
+        return Response({"results": results})
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        url_name="import",
+        parser_classes=[MultiPartParser],
+        serializer_class=BookmarkImportSerializer,
+    )
+    def import_bookmarks(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        if upload.size > settings.BOOKMARK_IMPORT_MAX_UPLOAD_SIZE:
+            return Response(
+                {
+                    "error": "Bookmark files are limited to {} bytes".format(
+                        settings.BOOKMARK_IMPORT_MAX_UPLOAD_SIZE
+                    )
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        bookmark_format = get_bookmark_format(
+            upload.name, serializer.validated_data.get("file_format")
+        )
+        if upload.size > settings.BOOKMARK_IMPORT_SYNC_MAX_SIZE:
+            path = default_storage.save(f"bookmark-imports/{upload.name}", upload)
+            user_id = request.user.id
+            transaction.on_commit(
+                lambda: import_bookmarks_file.delay(user_id, path, bookmark_format)
+            )
+            return Response({"status": "queued"}, status=status.HTTP_202_ACCEPTED)
+        stats = BookmarkImporter(request.user).run(
+            parse_bookmarks(upload, bookmark_format)
+        )
+        return Response(stats)
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        export_format = request.query_params.get("file_format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": "file_format must be one of ndjson, csv, html"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export_favourite_urls(queryset, export_format),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="favourites.{extension}"'
+        )
+        return response
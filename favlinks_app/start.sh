@@ -5,4 +5,16 @@ pip install -r requirements.txt
 python manage.py migrate
 python manage.py collectstatic --noinput
 python manage.py init_super_user
-python manage.py runserver 0.0.0.0:8000
+
+# DJANGO_SERVER picks the entry point: wsgi (default), asgi, or runserver for development
+case "${DJANGO_SERVER:-wsgi}" in
+  runserver)
+    exec python manage.py runserver 0.0.0.0:8000
+    ;;
+  asgi)
+    exec gunicorn config.asgi:application -c config/gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+    ;;
+  *)
+    exec gunicorn config.wsgi:application -c config/gunicorn.conf.py
+    ;;
+esac
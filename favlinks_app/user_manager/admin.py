@@ -6,12 +6,24 @@ from user_manager.models import User
 
 
 class CustomUserAdmin(UserAdmin):
-    readonly_fields = ("tags", "categories", "favourite_urls_count")
+    readonly_fields = (
+        "tags",
+        "categories",
+        "favourite_urls_count",
+        "favourite_tags_count",
+        "favourite_categories_count",
+    )
     fieldsets = UserAdmin.fieldsets + (
         (
             _("Favourites"),
             {
-                "fields": ("tags", "categories", "favourite_urls_count"),
+                "fields": (
+                    "tags",
+                    "categories",
+                    "favourite_urls_count",
+                    "favourite_tags_count",
+                    "favourite_categories_count",
+                ),
             },
         ),
     )
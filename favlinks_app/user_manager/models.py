@@ -20,6 +20,18 @@ class User(AbstractUser):
 
     @property
     def favourite_urls_count(self):
-        from favourite_manager.models import FavouriteUrl
+        from favourite_manager.counters import get_user_stats
 
-        return FavouriteUrl.objects.filter(user=self).count()
+        return get_user_stats(self).urls_count
+
+    @property
+    def favourite_tags_count(self):
+        from favourite_manager.counters import get_user_stats
+
+        return get_user_stats(self).tags_count
+
+    @property
+    def favourite_categories_count(self):
+        from favourite_manager.counters import get_user_stats
+
+        return get_user_stats(self).categories_count